@@ -0,0 +1,258 @@
+"""
+End-to-end timings of the release notes flow against a local fake repo1 + a synthetic Big Bang repo
+
+Measures calculate_release_tags, get_pkgs (release branch + last tag) and build_release_notes
+w/ a cold and a warm cache, for each --sizes package count
+
+Each size is run --repeats times after a discarded warm-up run (imports, first sqlite + template setup),
+the table shows the median
+
+benchmarks/baseline.json keeps one baseline per --backend/--latency-ms/--max-rps combination,
+runs w/ a combination that wasn't recorded skip the check
+
+Fails (exit 1) when a size needs more requests than its baseline, or when a step is slower
+than the baseline by more than --tolerance. Timings are compared relative to a fixed CPU workload timed
+on the same machine, so a baseline recorded elsewhere still applies
+
+    python benchmarks/bench_e2e.py
+    python benchmarks/bench_e2e.py --sizes 10 100 500 --latency-ms 20
+    python benchmarks/bench_e2e.py --update-baseline
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, redirect_stdout
+from pathlib import Path
+
+from tabulate import tabulate
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_repo1 import FakeRepo1  # noqa: E402
+from synthetic import (  # noqa: E402
+    fake_repo1_state,
+    make_bigbang_repo,
+    package_tags,
+    values_yaml,
+)
+
+from r2d2.cache import configure_cache  # noqa: E402
+from r2d2.console import Console  # noqa: E402
+from r2d2.gitlab import BigBangRepo1  # noqa: E402
+from r2d2.loaders import safe_load  # noqa: E402
+from r2d2.readme import build_release_notes  # noqa: E402
+from r2d2.repo import BigBangRepo  # noqa: E402
+from r2d2.session import configure_session  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent.joinpath("baseline.json")
+RELEASES = 3
+STEPS = [
+    "calculate_release_tags",
+    "get_pkgs",
+    "build_release_notes_cold",
+    "build_release_notes_warm",
+]
+
+
+@contextmanager
+def timed(results, step):
+    start = time.perf_counter()
+    yield
+    results[step] = (time.perf_counter() - start) * 1000
+
+
+def bench(size, latency, workdir, backend="graphql", max_rps=None):
+    """
+    {step: ms} for a synthetic Big Bang w/ `size` packages
+    """
+    tags = package_tags(size, RELEASES)
+    results = {}
+    with FakeRepo1(
+        **fake_repo1_state(tags, RELEASES), latency=latency, max_rps=max_rps
+    ) as fake, tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        bb_path = make_bigbang_repo(tmp, fake.url, tags, RELEASES)
+        configure_cache({"cache": {"path": os.path.join(tmp, "cache.db")}})
+        session = configure_session({})
+        console = Console()
+        console.is_quiet = True
+        config = {
+            "package_overrides": {},
+            "beta_list": [],
+            "fetch_concurrency": 8,
+            "fetch_backend": backend,
+        }
+
+        with timed(results, "calculate_release_tags"):
+            repo = BigBangRepo(str(bb_path))
+            repo1 = BigBangRepo1("repo1-bench", "minor", session=session, url=fake.url)
+            repo1.authenticate()
+            # from the local tags, like `release_tags: "local"`
+            repo1.calculate_release_tags(repo.tag_index().last_release())
+            repo1.set_release_branch(f"release-{repo1.next_release_tag_x}")
+
+        with timed(results, "get_pkgs"):
+            current = repo.get_pkgs(ref=repo1.release_branch)
+            previous = repo.get_pkgs(ref=str(repo1.last_release_tag))
+
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            for run in ("cold", "warm"):
+                # per package warnings are still printed when quiet
+                with timed(results, f"build_release_notes_{run}"), redirect_stdout(
+                    io.StringIO()
+                ):
+                    build_release_notes(
+                        repo1=repo1,
+                        current_pkgs=repo.get_pkgs(ref=repo1.release_branch),
+                        previous_pkgs=previous,
+                        console=console,
+                        config=config,
+                    )
+        finally:
+            os.chdir(cwd)
+
+        assert len(current) == size, f"expected {size} packages, got {len(current)}"
+        results["requests"] = fake.requests
+        results["throttled"] = fake.throttled
+    return results
+
+
+def repeated(size, repeats, *args):
+    """
+    Median of each step over `repeats` bench runs
+    """
+    runs = [bench(size, *args) for _ in range(max(1, repeats))]
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def calibrate(repeats=5):
+    """
+    ms to parse a 500 package values.yaml (median of repeats), the machine's speed timings are scaled by
+    """
+    text = values_yaml("https://repo1.dso.mil", package_tags(500, 1), 0)
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        safe_load(text)
+        runs.append((time.perf_counter() - start) * 1000)
+    return statistics.median(runs)
+
+
+def regressions(results, calibration, baseline, tolerance):
+    """
+    [(size, what, value, baseline value)] for every size needing more requests than the baseline
+    and every step slower than baseline * (1 + tolerance), relative to each run's calibration
+    """
+    slower = []
+    for size, steps in results.items():
+        expected = baseline["results"].get(size)
+        if expected is None:
+            continue
+        # 429s are the fake repo1's doing, only count the requests r2d2 chose to make
+        made = steps["requests"] - steps["throttled"]
+        if made > expected["requests"] - expected.get("throttled", 0):
+            slower.append((size, "requests", made, expected["requests"]))
+        scale = calibration / baseline["calibration_ms"]
+        for step in STEPS:
+            if steps[step] > expected[step] * scale * (1 + tolerance):
+                slower.append(
+                    (size, f"{step} (ms)", steps[step], expected[step] * scale)
+                )
+    return slower
+
+
+def baseline_key(args):
+    """
+    Baselines only apply to runs against the same fake repo1 + backend
+    """
+    return (
+        f"backend={args.backend},latency_ms={args.latency_ms:g},max_rps={args.max_rps}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--backend", choices=["graphql", "raw"], default="graphql")
+    parser.add_argument(
+        "--max-rps", type=int, help="throttle the fake repo1 w/ 429s past this rate"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="allowed slowdown vs the baseline, 0.5 = 50%%",
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=3, help="runs per size, the median is kept"
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        # warm-up, so the first size doesn't pay the process's one time costs
+        bench(min(args.sizes), latency, workdir, args.backend, args.max_rps)
+        for size in args.sizes:
+            results[str(size)] = repeated(
+                size, args.repeats, latency, workdir, args.backend, args.max_rps
+            )
+    calibration = calibrate()
+
+    print(
+        tabulate(
+            [
+                [
+                    size,
+                    *(f"{steps[step]:.1f}" for step in STEPS),
+                    steps["requests"],
+                    steps["throttled"],
+                ]
+                for size, steps in results.items()
+            ],
+            headers=[
+                "packages",
+                *(f"{step} (ms)" for step in STEPS),
+                "requests",
+                "429s",
+            ],
+            tablefmt="github",
+        )
+    )
+
+    baselines = {}
+    if args.baseline.exists():
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    key = baseline_key(args)
+
+    if args.update_baseline:
+        baselines[key] = {"calibration_ms": calibration, "results": results}
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2)
+        print(f"\n{key} baseline written to {args.baseline}")
+        return
+
+    baseline = baselines.get(key)
+    if baseline is None:
+        print(f"\nno {key} baseline in {args.baseline}, run w/ --update-baseline")
+        return
+
+    slower = regressions(results, calibration, baseline, args.tolerance)
+    for size, what, value, expected in slower:
+        print(f"FAIL: {size} packages {what}: {value:.1f} vs {expected:.1f} baseline")
+    if slower:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Cold import time of the r2d2 entry point, measured w/ `python -X importtime`
+
+Fails (exit 1) when importing r2d2.cli takes longer than --threshold-ms
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --threshold-ms 250 --top 15
+"""
+import argparse
+import subprocess
+import sys
+
+
+def importtime(module):
+    """
+    {imported module: (self us, cumulative us)} for a fresh interpreter importing module
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="r2d2.cli")
+    parser.add_argument("--threshold-ms", type=float, default=300)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("-n", "--number", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [importtime(args.module) for _ in range(args.number)]
+    best = min(runs, key=lambda times: times[args.module][1])
+    total_ms = best[args.module][1] / 1000
+
+    print(f"slowest imports under {args.module}:")
+    for name, (_, cumulative_us) in sorted(
+        best.items(), key=lambda item: item[1][1], reverse=True
+    )[1 : args.top + 1]:
+        print(f"{cumulative_us / 1000:10.1f} ms  {name}")
+    print(f"\n{args.module}: {total_ms:.1f} ms (threshold {args.threshold_ms:.0f} ms)")
+
+    if total_ms > args.threshold_ms:
+        print(
+            "FAIL: import time regression, move heavy imports into the step using them"
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Parse-time of chart/values.yaml w/ the round-trip loader vs r2d2.loaders.safe_load
+
+    python benchmarks/bench_yaml.py                           # synthetic, Big Bang sized values.yaml
+    python benchmarks/bench_yaml.py ../bigbang/chart/values.yaml
+"""
+import argparse
+import timeit
+
+from ruamel.yaml import YAML
+
+from r2d2.loaders import safe_load
+
+PKG_TEMPLATE = """
+# -- {name} settings
+{name}:
+  # -- Toggle deployment of {name}.
+  enabled: true
+  git:
+    # -- Git repo holding the {name} helm chart
+    repo: https://repo1.dso.mil/platform-one/big-bang/apps/{kind}/{name}.git
+    path: "./chart"
+    tag: "1.{i}.0-bb.0"
+  # -- Flux reconciliation overrides
+  flux:
+    install:
+      remediation:
+        retries: -1
+    upgrade:
+      remediation:
+        retries: 3
+  ingress:
+    gateway: "public"
+  sso:
+    enabled: false
+    client_id: ""
+    client_secret: ""
+  database:
+    host: ""
+    port: 5432
+    username: ""
+    password: ""
+  objectStorage:
+    endpoint: ""
+    region: ""
+    bucket: ""
+  # -- Values to passthrough to the {name} chart
+  values:
+    replicas: 1
+    resources:
+      requests: {{cpu: 100m, memory: 128Mi}}
+      limits: {{cpu: 500m, memory: 512Mi}}
+    tolerations: []
+    nodeSelector: {{}}
+  postRenderers: []
+"""
+
+
+def synthetic_values(core=15, addons=25):
+    """
+    Roughly the size + shape of Big Bang's chart/values.yaml
+    """
+    core_yaml = "".join(
+        PKG_TEMPLATE.format(name=f"core{i}", kind="core", i=i) for i in range(core)
+    )
+    addons_yaml = "".join(
+        PKG_TEMPLATE.format(name=f"addon{i}", kind="sandbox", i=i)
+        for i in range(addons)
+    )
+    indented_addons = "\n".join(
+        "  " + line if line else line for line in addons_yaml.split("\n")
+    )
+    return f"domain: bigbang.dev\n{core_yaml}\naddons:\n{indented_addons}\n"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("values", nargs="?", help="path to a real values.yaml")
+    parser.add_argument("-n", "--number", type=int, default=20)
+    args = parser.parse_args()
+
+    text = open(args.values).read() if args.values else synthetic_values()
+    print(f"values.yaml: {len(text.splitlines())} lines, {len(text) / 1024:.0f} KiB")
+
+    rt_yaml = YAML(typ="rt")
+    loaders = {
+        "round-trip": lambda: rt_yaml.load(text),
+        "safe_load": lambda: safe_load(text),
+    }
+    results = {}
+    for name, load in loaders.items():
+        results[name] = min(timeit.repeat(load, number=1, repeat=args.number))
+        print(f"{name:>12}: {results[name] * 1000:8.2f} ms")
+    print(f"     speedup: {results['round-trip'] / results['safe_load']:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Check that r2d2.changelog (normalize + parse) still builds exactly what the old
+replace("\\n---") + keepachangelog.to_dict path built, for sample changelogs + any CHANGELOG.md passed in
+
+r2d2.changelog leans on private keepachangelog helpers, run this after bumping the keepachangelog pin
+
+    python benchmarks/check_changelog.py
+    python benchmarks/check_changelog.py ../istio-controlplane/CHANGELOG.md
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import keepachangelog
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_repo1 import changelog_md  # noqa: E402
+
+from r2d2.changelog import normalize, parse  # noqa: E402
+
+SAMPLES = {
+    "synthetic": changelog_md("istio", "1.12.0-bb.0"),
+    "edge cases": """# Changelog
+
+Format: [Keep a Changelog](https://keepachangelog.com/en/1.0.0/)
+
+---
+## [Unreleased]
+### Added
+- Not released yet
+---
+## [1.3.0-bb.1]
+- Uncategorized item
+### Changed
+- Multi word item w/ a [link](https://repo1.dso.mil)
+----
+## [1.3.0-bb.0] - 2022-03-04
+### Fixed
+- First fix
+- Second fix
+### Added
+- Something new
+---
+
+## 1.2.0-bb.0 - 2022-02-01
+### Changed
+- Unlinked heading
+---
+## [1.1.0-bb.0]
+""",
+}
+
+
+def old_to_dict(text):
+    """
+    The changelog handling r2d2.changelog replaced, kept as the reference
+    """
+    changelog = text.replace("\n---", "")
+    clean_changelog = []
+    for line in changelog.split("\n"):
+        if line.startswith("## ") and len(line.split("-")) <= 3:
+            line = line.strip() + " - 1970-01-01"
+        if line.startswith("#") or line.startswith("-"):
+            clean_changelog.append(line)
+    return keepachangelog.to_dict(clean_changelog)
+
+
+def check(name, text):
+    """
+    Mismatches between the old + new parse of text, in full and stopped at each of its releases
+    """
+    expected = old_to_dict(text)
+    changes, stopped = parse(normalize(text.splitlines()))
+    failures = []
+    if changes != expected or stopped:
+        failures.append(f"{name}: full parse differs")
+
+    versions = list(expected)
+    for version in versions:
+        changes, stopped = parse(normalize(text.splitlines()), stop_at=version)
+        # everything above the stop_at heading, in the same order
+        above = {v: expected[v] for v in versions[: versions.index(version)]}
+        if not stopped or changes != above:
+            failures.append(f"{name}: parse stopped at {version} differs")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("changelogs", type=Path, nargs="*")
+    args = parser.parse_args()
+
+    samples = dict(SAMPLES)
+    for path in args.changelogs:
+        samples[str(path)] = path.read_text()
+
+    failures = []
+    for name, text in samples.items():
+        failures += check(name, text)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"{len(samples)} changelogs parse the same as keepachangelog.to_dict")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Local stand-in for repo1.dso.mil, serves the GitLab API endpoints BigBangRepo1 uses, raw package files
+and GraphQL blob queries
+
+    with FakeRepo1(packages, releases, latency=0.02) as repo1:
+        BigBangRepo1(token="repo1-bench", release_type="minor", url=repo1.url)
+"""
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+BB_ID = 2872
+
+CHART_TEMPLATE = """apiVersion: v2
+name: {name}
+version: {tag}
+annotations:
+  bigbang.dev/applicationVersions: |
+    - {title}: v{app_version}
+"""
+
+
+def chart_yaml(name, tag):
+    return CHART_TEMPLATE.format(
+        name=name,
+        tag=tag,
+        title=name.replace("-", " ").title(),
+        app_version=tag.split("-")[0],
+    )
+
+
+def changelog_md(name, tag, history=50):
+    """
+    A KAC-ish changelog for name@tag, w/ `history` older versions below the ones the synthetic repo uses
+    """
+    major, minor, _ = tag.split("-")[0].split(".")
+    lines = [
+        "# Changelog",
+        "",
+        "Format: [Keep a Changelog](https://keepachangelog.com/en/1.0.0/)",
+        "",
+        "---",
+    ]
+    for i in range(int(minor), -history, -1):
+        version = f"{major}.{i}.0-bb.0" if i >= 0 else f"0.{-i}.0-bb.0"
+        lines += [
+            f"## [{version}] - 2022-01-{(abs(i) % 28) + 1:02d}",
+            "### Changed",
+            f"- {name} bumped to {version}",
+            "- Updated helm chart dependencies",
+            "### Added",
+            "- Something new",
+            "---",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+class FakeRepo1:
+    """
+    Threaded HTTP server, pkgs: {name: [tags]}, releases: [tag names] newest first
+
+    Every response is delayed by `latency` seconds to mimic a remote server
+    """
+
+    def __init__(
+        self,
+        packages=None,
+        releases=None,
+        branches=None,
+        mrs=30,
+        latency=0.0,
+        max_rps=None,
+    ):
+        self.packages = packages or {}
+        self.releases = releases or []
+        self.branches = branches or {}
+        self.mrs = mrs
+        self.latency = latency
+        # like GitLab's rate limits: 429 + Retry-After past max_rps requests per second
+        self.max_rps = max_rps
+        self.requests = 0
+        self.throttled = 0
+        self._window = None
+        self._window_requests = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def rate_limit(self):
+        """
+        Count a request, returns (admitted, RateLimit-* headers), max_rps requests per fixed 1s window
+        """
+        now = time.time()
+        with self._lock:
+            self.requests += 1
+            if self.max_rps is None:
+                return True, {}
+            window = int(now)
+            if self._window != window:
+                self._window, self._window_requests = window, 0
+            admitted = self._window_requests < self.max_rps
+            if admitted:
+                self._window_requests += 1
+            else:
+                self.throttled += 1
+            remaining = self.max_rps - self._window_requests
+        headers = {
+            "RateLimit-Limit": str(self.max_rps),
+            "RateLimit-Remaining": str(remaining),
+            "RateLimit-Reset": str(window + 1),
+        }
+        if not admitted:
+            headers["Retry-After"] = str(math.ceil(window + 1 - now))
+        return admitted, headers
+
+    def pkg_repo(self, name):
+        return f"{self.url}/big-bang/apps/{name}.git"
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *_):
+                pass
+
+            def do_GET(self):
+                if not self.admit():
+                    return
+                parts = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+                status, body, headers = fake.route(parts.path, query)
+                self.respond(status, body, headers)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if not self.admit():
+                    return
+                if urlsplit(self.path).path != "/api/graphql":
+                    self.respond(404, {"message": "404 Not Found"})
+                elif not self.headers.get("Authorization", "").startswith("Bearer "):
+                    self.respond(401, {"message": "401 Unauthorized"})
+                else:
+                    self.respond(200, fake.graphql(payload.get("variables") or {}))
+
+            def admit(self):
+                time.sleep(fake.latency)
+                admitted, self.rate_limit_headers = fake.rate_limit()
+                if not admitted:
+                    self.respond(429, {"message": "429 Too Many Requests"})
+                return admitted
+
+            def respond(self, status, body, headers=None):
+                if isinstance(body, (dict, list)):
+                    body = json.dumps(body)
+                    headers = {"Content-Type": "application/json", **(headers or {})}
+                body = body.encode() if isinstance(body, str) else body
+                etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+                if status == 200 and self.headers.get("If-None-Match") == etag:
+                    status, body = 304, b""
+                self.send_response(status)
+                headers = {**(headers or {}), **self.rate_limit_headers}
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                if status in (200, 304):
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def route(self, path, query):
+        api = f"/api/v4/projects/{BB_ID}"
+        if path == api:
+            return 200, {"id": BB_ID, "path_with_namespace": "big-bang/bigbang"}, {}
+        if path == f"{api}/releases":
+            releases = [
+                {
+                    "tag_name": tag,
+                    "commit": {"short_id": f"{i:08x}", "author_name": "R2-D2"},
+                }
+                for i, tag in enumerate(self.releases)
+            ]
+            return self.paginate(path, query, releases)
+        if path.startswith(f"{api}/repository/branches/"):
+            name = path.rsplit("/", 1)[-1]
+            if name not in self.branches:
+                return 404, {"message": "404 Branch Not Found"}, {}
+            return 200, {"name": name, "commit": {"short_id": self.branches[name]}}, {}
+        if path == f"{api}/merge_requests":
+            return self.paginate(path, query, self.merge_requests())
+
+        raw = re.fullmatch(r"/big-bang/apps/([^/]+)/-/raw/([^/]+)/(.+)", path)
+        if raw:
+            content = self.file(*raw.groups())
+            if content is None:
+                return 404, "Not Found", {}
+            return 200, content, {"Content-Type": "text/plain"}
+        return 404, {"message": "404 Not Found"}, {}
+
+    def file(self, name, tag, file):
+        if tag not in self.packages.get(name, []):
+            return None
+        if file == "chart/Chart.yaml":
+            return chart_yaml(name, tag)
+        if file == "CHANGELOG.md":
+            return changelog_md(name, tag)
+        return None
+
+    def merge_requests(self):
+        return [
+            {
+                "iid": i,
+                "reference": f"!{i}",
+                "web_url": f"{self.url}/big-bang/bigbang/-/merge_requests/{i}",
+                "title": f"Bump package {i}",
+                "state": "merged",
+            }
+            for i in range(self.mrs, 0, -1)
+        ]
+
+    def graphql(self, variables):
+        """
+        Answers the queries of BigBangRepo1: merged MRs ($path + $milestone, cursors are list offsets)
+        and blobs, where projects are aliased p0..pN w/ $pathN + $refN variables
+        """
+        if "milestone" in variables:
+            start = int(variables.get("after") or 0)
+            end = start + int(variables.get("first") or 100)
+            mrs = self.merge_requests()
+            nodes = [
+                {
+                    "reference": mr["reference"],
+                    "webUrl": mr["web_url"],
+                    "title": mr["title"],
+                }
+                for mr in mrs[start:end]
+            ]
+            page_info = {"hasNextPage": end < len(mrs), "endCursor": str(end)}
+            return {
+                "data": {
+                    "project": {
+                        "mergeRequests": {"pageInfo": page_info, "nodes": nodes}
+                    }
+                }
+            }
+
+        data = {}
+        i = 0
+        while f"path{i}" in variables:
+            name = variables[f"path{i}"].rsplit("/", 1)[-1]
+            ref = variables[f"ref{i}"]
+            if name not in self.packages:
+                data[f"p{i}"] = None
+            else:
+                nodes = []
+                for path in variables["paths"]:
+                    content = self.file(name, ref, path)
+                    if content is not None:
+                        nodes.append({"path": path, "rawBlob": content})
+                data[f"p{i}"] = {"repository": {"blobs": {"nodes": nodes}}}
+            i += 1
+        return {"data": data}
+
+    def paginate(self, path, query, items):
+        page = int(query.get("page", 1))
+        per_page = int(query.get("per_page", 20))
+        chunk = items[(page - 1) * per_page : page * per_page]
+        headers = {
+            "X-Page": str(page),
+            "X-Per-Page": str(per_page),
+            "X-Total": str(len(items)),
+        }
+        if page * per_page < len(items):
+            next_query = {**query, "page": page + 1, "per_page": per_page}
+            next_url = f"{self.url}{path}?" + "&".join(
+                f"{k}={v}" for k, v in next_query.items()
+            )
+            headers["X-Next-Page"] = str(page + 1)
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        return 200, chunk, headers
@@ -0,0 +1,102 @@
+"""
+Synthetic Big Bang git repo: chart/values.yaml w/ a configurable number of core + addon packages,
+one tag + release branch per release and a release branch for the next release
+"""
+import subprocess
+from pathlib import Path
+
+CORE_SHARE = 3  # 1 in 3 packages is core, the rest are addons
+
+
+def package_tags(packages, releases):
+    """
+    {name: [tag at release 0, ..., tag at release `releases` (the next release)]}
+
+    About a third of the packages are bumped in each release
+    """
+    tags = {}
+    for k in range(packages):
+        name = f"core-pkg-{k}" if k % CORE_SHARE == 0 else f"addon-pkg-{k}"
+        bumps = 0
+        tags[name] = []
+        for r in range(releases + 1):
+            if r > 0 and (k + r) % 3 == 0:
+                bumps += 1
+            tags[name].append(f"1.{bumps}.0-bb.0")
+    return tags
+
+
+def values_yaml(repo1_url, tags, release):
+    core, addons = [], []
+    for name, pkg_tags in tags.items():
+        entry = [
+            f"{name}:",
+            "  # -- Toggle deployment",
+            "  enabled: true",
+            "  git:",
+            f"    repo: {repo1_url}/big-bang/apps/{name}.git",
+            '    path: "./chart"',
+            f"    tag: {pkg_tags[release]}",
+            "  values: {}",
+        ]
+        (core if name.startswith("core") else addons).append(entry)
+
+    lines = ["domain: bigbang.dev", ""]
+    for entry in core:
+        lines += entry
+    lines.append("addons:")
+    for entry in addons:
+        lines += ["  " + line for line in entry]
+    return "\n".join(lines) + "\n"
+
+
+def git(*args, cwd):
+    subprocess.run(
+        ["git", "-c", "user.name=R2-D2", "-c", "user.email=r2d2@bigbang.dev", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+def make_bigbang_repo(path, repo1_url, tags, releases):
+    """
+    Build an "origin" repo w/ tags 1.0.0 ... 1.{releases - 1}.0 + release-1.{releases}.x, returns a clone of it
+    """
+    path = Path(path)
+    origin = path.joinpath("origin")
+    origin.joinpath("chart").mkdir(parents=True)
+    git("init", "-q", "-b", "master", cwd=origin)
+
+    for release in range(releases + 1):
+        origin.joinpath("chart/values.yaml").write_text(
+            values_yaml(repo1_url, tags, release)
+        )
+        origin.joinpath("chart/Chart.yaml").write_text(
+            f"apiVersion: v2\nname: bigbang\nversion: 1.{release}.0\n"
+        )
+        git("add", ".", cwd=origin)
+        git("commit", "-q", "-m", f"release 1.{release}.0", cwd=origin)
+        if release < releases:
+            git("tag", f"1.{release}.0", cwd=origin)
+        git("branch", f"release-1.{release}.x", cwd=origin)
+
+    clone = path.joinpath("bigbang")
+    git("clone", "-q", str(origin), str(clone), cwd=path)
+    return clone
+
+
+def fake_repo1_state(tags, releases):
+    """
+    Releases (newest first, w/ an rc on top), branches and package tags for FakeRepo1
+    """
+    release_names = [f"1.{releases}.0-rc.0"] + [
+        f"1.{release}.0" for release in range(releases - 1, -1, -1)
+    ]
+    branches = {
+        f"release-1.{release}.x": f"{i + 1:08x}"
+        for i, release in enumerate(range(releases - 1, -1, -1))
+    }
+    branches[f"release-1.{releases}.x"] = "ffffffff"
+    packages = {name: set(pkg_tags) for name, pkg_tags in tags.items()}
+    return {"releases": release_names, "branches": branches, "packages": packages}
@@ -0,0 +1,128 @@
+import os
+import re
+import tempfile
+
+from ruamel.yaml import YAML
+from ruamel.yaml.nodes import MappingNode, SequenceNode
+
+# every version reference "Upgrade version references" bumps to the next release's tag,
+# add more w/ `version_refs` in ~/.r2d2/config.yaml:
+#   {file, path}: a dotted path to a YAML scalar, list items by index (e.g. "spec.ref.tag")
+#   {file, pattern}: a regex, the text of its first group is replaced
+VERSION_REFS = [
+    {"file": "base/gitrepository.yaml", "path": "spec.ref.tag"},
+    {"file": "chart/Chart.yaml", "path": "version"},
+]
+
+
+def find_scalar(text, path):
+    """
+    (start, end, quote) of the scalar at the dotted path in a YAML document, w/o loading the rest of it
+    """
+    node = YAML(typ="safe").compose(text)
+    for key in path.split("."):
+        if isinstance(node, MappingNode):
+            node = next((v for k, v in node.value if k.value == key), None)
+        elif isinstance(node, SequenceNode) and key.isdigit():
+            node = node.value[int(key)] if int(key) < len(node.value) else None
+        else:
+            node = None
+        if node is None:
+            raise ValueError(f"{path} not found")
+    if isinstance(node, (MappingNode, SequenceNode)):
+        raise ValueError(f"{path} is not a scalar")
+    quote = node.style if node.style in ("'", '"') else ""
+    return node.start_mark.index, node.end_mark.index, quote
+
+
+def yaml_edits(text, path, value):
+    start, end, quote = find_scalar(text, path)
+    return [(start, end, f"{quote}{value}{quote}")]
+
+
+def pattern_edits(text, pattern, value):
+    try:
+        groups = re.compile(pattern).groups
+    except re.error as e:
+        raise ValueError(f"{pattern} is not a valid regex ({e})") from e
+    if groups < 1:
+        raise ValueError(f"{pattern} has no group to replace")
+    edits = [
+        (match.start(1), match.end(1), value)
+        for match in re.finditer(pattern, text, re.MULTILINE)
+    ]
+    if not edits:
+        raise ValueError(f"{pattern} not found")
+    return edits
+
+
+def apply_edits(text, edits):
+    # back to front, so the earlier offsets stay valid
+    for start, end, value in sorted(edits, reverse=True):
+        text = text[:start] + value + text[end:]
+    return text
+
+
+def plan(bb_path, version, refs=VERSION_REFS):
+    """
+    {file: new content} of every file whose version references change, nothing is written
+    """
+    by_file = {}
+    for ref in refs:
+        by_file.setdefault(ref["file"], []).append(ref)
+
+    changes = {}
+    for file, file_refs in by_file.items():
+        path = os.path.join(bb_path, file)
+        with open(path, newline="") as f:
+            text = f.read()
+        edits = []
+        for ref in file_refs:
+            try:
+                if "path" in ref:
+                    edits += yaml_edits(text, ref["path"], version)
+                else:
+                    edits += pattern_edits(text, ref["pattern"], version)
+            except ValueError as e:
+                raise ValueError(f"{file}: {e}") from e
+        # two refs to the same scalar (e.g. a default ref repeated in version_refs) are one edit
+        edits = sorted(set(edits))
+        for (start, end, _), (next_start, _, _) in zip(edits, edits[1:]):
+            if next_start < end:
+                raise ValueError(
+                    f"{file}: version references overlap at {text[start:end]!r}"
+                )
+        new_text = apply_edits(text, edits)
+        if new_text != text:
+            changes[path] = new_text
+    return changes
+
+
+def write_atomic(path, text):
+    """
+    Write to a temp file next to path, then rename it over path, so a crash never leaves it half written
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}."
+    )
+    try:
+        with os.fdopen(fd, "w", newline="") as f:
+            f.write(text)
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def bump_versions(bb_path, version, refs=VERSION_REFS):
+    """
+    Set every version reference to version in one pass, returns the files that changed
+
+    All edits are planned before the first write, a missing reference leaves every file untouched
+    """
+    changes = plan(bb_path, str(version), refs)
+    for path, text in changes.items():
+        write_atomic(path, text)
+    return list(changes)
@@ -0,0 +1,478 @@
+import json
+import os
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+CACHE_DEFAULTS = {
+    "path": "~/.r2d2/cache.db",
+    "max_age_days": 30,
+    "max_size_mb": 100,
+}
+
+# bump when the schema changes, it's a cache so old stores are simply rebuilt
+SCHEMA_VERSION = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    repo TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    chart TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    used_at REAL NOT NULL,
+    -- 0 until the changelog is stored
+    changelog_fetched INTEGER NOT NULL DEFAULT 0,
+    -- version heading a streamed download stopped at, NULL when the whole changelog is stored
+    changelog_until TEXT,
+    PRIMARY KEY (repo, tag)
+);
+CREATE TABLE IF NOT EXISTS changelog_entries (
+    repo TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    version TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    PRIMARY KEY (repo, tag, position)
+);
+CREATE INDEX IF NOT EXISTS changelog_versions ON changelog_entries (repo, tag, version);
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    stored_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    used_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+"""
+
+# sqlite INTEGER upper bound, used as an open-ended slice
+SQLITE_MAX_INT = 2**63 - 1
+
+_cache = None
+_responses = None
+_entries = None
+
+
+class Store:
+    """
+    Single-file sqlite store at ~/.r2d2/cache.db
+    """
+
+    def __init__(self, path=CACHE_DEFAULTS["path"]):
+        self.path = Path(path).expanduser()
+        os.makedirs(self.path.parent, exist_ok=True)
+        with self._connect() as db:
+            if db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                for (table,) in db.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                ).fetchall():
+                    db.execute(f"DROP TABLE IF EXISTS {table}")
+                db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            db.executescript(SCHEMA)
+            db.execute("PRAGMA journal_mode=WAL")
+
+    @contextmanager
+    def _connect(self):
+        # one connection per call keeps the store safe to use from the fetch thread pool
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+
+class PackageCache(Store):
+    """
+    Parsed package charts + changelogs, keyed by (repo, tag)
+
+    Changelogs are stored one row per version in file order, so the diff between two versions is a slice
+    """
+
+    def __init__(
+        self,
+        path=CACHE_DEFAULTS["path"],
+        max_age_days=CACHE_DEFAULTS["max_age_days"],
+        max_size_mb=CACHE_DEFAULTS["max_size_mb"],
+    ):
+        super().__init__(path)
+        self.max_age_days = max_age_days
+        self.max_size_mb = max_size_mb
+
+    def get(self, repo, tag):
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT chart FROM packages WHERE repo = ? AND tag = ?", (repo, tag)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE packages SET used_at = ? WHERE repo = ? AND tag = ?",
+                (time.time(), repo, tag),
+            )
+        return {"chart": json.loads(row[0])}
+
+    def put_chart(self, repo, tag, chart):
+        chart = json.dumps(chart, default=str)
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                """
+                INSERT INTO packages (repo, tag, chart, size, fetched_at, used_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (repo, tag) DO UPDATE SET chart = excluded.chart
+                """,
+                (repo, tag, chart, len(chart), now, now),
+            )
+
+    def put_changelog(self, repo, tag, changelog, until=None):
+        """
+        Store the changelog of repo@tag, until is the version heading the download stopped at (None if complete)
+        """
+        entries = [
+            (repo, tag, position, version, json.dumps(entry, default=str))
+            for position, (version, entry) in enumerate(changelog.items())
+        ]
+        with self._connect() as db:
+            db.execute(
+                "DELETE FROM changelog_entries WHERE repo = ? AND tag = ?", (repo, tag)
+            )
+            db.executemany(
+                "INSERT INTO changelog_entries VALUES (?, ?, ?, ?, ?)", entries
+            )
+            db.execute(
+                """
+                UPDATE packages
+                SET changelog_fetched = 1, changelog_until = ?, size = LENGTH(chart) + ?
+                WHERE repo = ? AND tag = ?
+                """,
+                (until, sum(len(entry[-1]) for entry in entries), repo, tag),
+            )
+
+    def has_changelog(self, repo, tag, since_version=None):
+        """
+        Whether the stored changelog of repo@tag reaches back to since_version (or is complete when None)
+        """
+        with self._connect() as db:
+            return self._has_changelog(db, repo, tag, since_version)
+
+    def missing(self, keys):
+        """
+        The (repo, tag, since_version, changelog) keys w/o a stored chart (+ changelog reaching back to since_version
+        when changelog), checked over one connection
+        """
+        with self._connect() as db:
+            return [
+                key
+                for key in keys
+                if not (
+                    self._has_changelog(db, *key[:3])
+                    if key[3]
+                    else self._has_chart(db, *key[:2])
+                )
+            ]
+
+    def _has_chart(self, db, repo, tag):
+        return (
+            db.execute(
+                "SELECT 1 FROM packages WHERE repo = ? AND tag = ?", (repo, tag)
+            ).fetchone()
+            is not None
+        )
+
+    def _has_changelog(self, db, repo, tag, since_version):
+        # a changelog is only ever stored next to its chart
+        since_version = str(since_version).lower() if since_version else None
+        row = db.execute(
+            """
+            SELECT changelog_fetched, changelog_until FROM packages
+            WHERE repo = ? AND tag = ?
+            """,
+            (repo, tag),
+        ).fetchone()
+        if row is None or not row[0]:
+            return False
+        if row[1] is None or row[1] == since_version:
+            return True
+        return since_version is not None and bool(
+            db.execute(
+                """
+                SELECT 1 FROM changelog_entries
+                WHERE repo = ? AND tag = ? AND version = ?
+                """,
+                (repo, tag, since_version),
+            ).fetchone()
+        )
+
+    def changelog_since(self, repo, tag, since_version):
+        """
+        Changelog entries of repo@tag newer than since_version, all entries if since_version is not in the changelog
+
+        Returns None when no changelog is stored for repo@tag
+        """
+        with self._connect() as db:
+            if not db.execute(
+                """
+                SELECT 1 FROM packages
+                WHERE repo = ? AND tag = ? AND changelog_fetched = 1
+                """,
+                (repo, tag),
+            ).fetchone():
+                return None
+            since = db.execute(
+                """
+                SELECT MIN(position) FROM changelog_entries
+                WHERE repo = ? AND tag = ? AND version = ?
+                """,
+                (repo, tag, str(since_version).lower()),
+            ).fetchone()[0]
+            rows = db.execute(
+                """
+                SELECT version, entry FROM changelog_entries
+                WHERE repo = ? AND tag = ? AND position < ?
+                ORDER BY position
+                """,
+                (repo, tag, since if since is not None else SQLITE_MAX_INT),
+            ).fetchall()
+        return {version: json.loads(entry) for version, entry in rows}
+
+    def stats(self):
+        with self._connect() as db:
+            packages, size, oldest = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(used_at) FROM packages"
+            ).fetchone()
+            versions = db.execute("SELECT COUNT(*) FROM changelog_entries").fetchone()
+            responses = db.execute("SELECT COUNT(*) FROM responses").fetchone()
+            entries = db.execute("SELECT COUNT(*) FROM entries").fetchone()
+        return {
+            "path": str(self.path),
+            "packages": packages,
+            "changelog_versions": versions[0],
+            "responses": responses[0],
+            "entries": entries[0],
+            "data_size": size,
+            "file_size": self.path.stat().st_size,
+            "oldest_used_at": oldest,
+        }
+
+    def prune(self):
+        """
+        Evict packages unused for max_age_days, then least recently used ones until the data fits in max_size_mb
+        """
+        cutoff = time.time() - self.max_age_days * 24 * 60 * 60
+        with self._connect() as db:
+            evicted = db.execute(
+                "SELECT repo, tag FROM packages WHERE used_at < ?", (cutoff,)
+            ).fetchall()
+
+            budget = self.max_size_mb * 1024 * 1024
+            total = 0
+            for repo, tag, size in db.execute(
+                "SELECT repo, tag, size FROM packages WHERE used_at >= ? ORDER BY used_at DESC",
+                (cutoff,),
+            ).fetchall():
+                total += size
+                if total > budget:
+                    evicted.append((repo, tag))
+
+            db.executemany("DELETE FROM packages WHERE repo = ? AND tag = ?", evicted)
+            db.executemany(
+                "DELETE FROM changelog_entries WHERE repo = ? AND tag = ?", evicted
+            )
+        if evicted:
+            with self._connect() as db:
+                db.execute("VACUUM")
+
+        # the old ~/.r2d2/cache/{name}_{tag}/ directory tree is no longer read
+        legacy_dir = Path.home().joinpath(".r2d2/cache")
+        if is_legacy_cache(legacy_dir, self.path):
+            shutil.rmtree(legacy_dir)
+
+        return len(evicted)
+
+
+def is_legacy_cache(path, store_path):
+    """
+    Whether path only holds the old {name}_{tag}/Chart.yaml + CHANGELOG.md layout, and not the store itself
+    """
+    path = Path(path)
+    if not path.is_dir():
+        return False
+    store_path = Path(store_path).expanduser().resolve()
+    if path.resolve() in store_path.parents:
+        return False
+    for entry in path.iterdir():
+        if not entry.is_dir() or "_" not in entry.name:
+            return False
+        if any(f.name not in ("Chart.yaml", "CHANGELOG.md") for f in entry.iterdir()):
+            return False
+    return True
+
+
+class ResponseCache(Store):
+    """
+    Raw HTTP responses + their validators (ETag/Last-Modified), used to revalidate GitLab API calls
+    """
+
+    def __init__(
+        self,
+        path=CACHE_DEFAULTS["path"],
+        max_age_days=CACHE_DEFAULTS["max_age_days"],
+    ):
+        super().__init__(path)
+        self.max_age_days = max_age_days
+
+    def get(self, key):
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT headers, body, stored_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"headers": json.loads(row[0]), "body": row[1], "stored_at": row[2]}
+
+    def put(self, key, url, headers, body):
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, url, json.dumps(dict(headers)), body, time.time()),
+            )
+
+    def touch(self, key):
+        with self._connect() as db:
+            db.execute(
+                "UPDATE responses SET stored_at = ? WHERE key = ?", (time.time(), key)
+            )
+
+    def prune(self):
+        cutoff = time.time() - self.max_age_days * 24 * 60 * 60
+        with self._connect() as db:
+            return db.execute(
+                "DELETE FROM responses WHERE stored_at < ?", (cutoff,)
+            ).rowcount
+
+
+class KeyValueCache(Store):
+    """
+    JSON values keyed by (namespace, key), for anything derived from content we can hash
+    """
+
+    def __init__(
+        self,
+        path=CACHE_DEFAULTS["path"],
+        max_age_days=CACHE_DEFAULTS["max_age_days"],
+    ):
+        super().__init__(path)
+        self.max_age_days = max_age_days
+
+    def get(self, namespace, key):
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute(
+                "UPDATE entries SET used_at = ? WHERE namespace = ? AND key = ?",
+                (time.time(), namespace, key),
+            )
+        return json.loads(row[0])
+
+    def get_many(self, namespace, keys):
+        """
+        {key: value} of the keys found in namespace, over one connection
+        """
+        values = {}
+        now = time.time()
+        with self._connect() as db:
+            for key in keys:
+                row = db.execute(
+                    "SELECT value FROM entries WHERE namespace = ? AND key = ?",
+                    (namespace, key),
+                ).fetchone()
+                if row is not None:
+                    values[key] = json.loads(row[0])
+            db.executemany(
+                "UPDATE entries SET used_at = ? WHERE namespace = ? AND key = ?",
+                [(now, namespace, key) for key in values],
+            )
+        return values
+
+    def put(self, namespace, key, value):
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, default=str), time.time()),
+            )
+
+    def put_many(self, namespace, values):
+        """
+        Store every {key: value} in namespace in one transaction
+        """
+        now = time.time()
+        with self._connect() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                [
+                    (namespace, key, json.dumps(value, default=str), now)
+                    for key, value in values.items()
+                ],
+            )
+
+    def prune(self):
+        cutoff = time.time() - self.max_age_days * 24 * 60 * 60
+        with self._connect() as db:
+            return db.execute(
+                "DELETE FROM entries WHERE used_at < ?", (cutoff,)
+            ).rowcount
+
+
+def configure_cache(config=None):
+    """
+    Open the stores configured by the `cache` section of ~/.r2d2/config.yaml
+    """
+    global _cache, _responses, _entries
+    settings = {**CACHE_DEFAULTS, **((config or {}).get("cache") or {})}
+    _cache = PackageCache(**{k: settings[k] for k in CACHE_DEFAULTS})
+    _responses = ResponseCache(settings["path"], settings["max_age_days"])
+    _entries = KeyValueCache(settings["path"], settings["max_age_days"])
+    return _cache
+
+
+def get_cache():
+    if _cache is None:
+        return configure_cache()
+    return _cache
+
+
+def get_response_cache():
+    if _responses is None:
+        configure_cache()
+    return _responses
+
+
+def get_kv_cache():
+    if _entries is None:
+        configure_cache()
+    return _entries
+
+
+def prune():
+    """
+    Evict expired entries from every store, returns the number of evictions per store
+    """
+    return {
+        "packages": get_cache().prune(),
+        "responses": get_response_cache().prune(),
+        "entries": get_kv_cache().prune(),
+    }
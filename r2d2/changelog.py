@@ -0,0 +1,76 @@
+# using keepachangelog==2.0.0.dev2, its line helpers keep our output identical to keepachangelog.to_dict
+from keepachangelog._changelog import (
+    add_category,
+    add_information,
+    add_release,
+    is_category,
+    is_release,
+    unlink,
+)
+
+
+def normalize(lines):
+    """
+    Make our changelogs actually KAC compliant in a single pass over the lines
+
+    Same result as stripping every "\\n---", adding a fake " - 1970-01-01" date to undated "## " headings
+    and keeping only headings + list items
+    """
+    pending = None
+    for line in lines:
+        if pending is not None and line.startswith("---"):
+            # "\\n---" is dropped, so whatever follows it joins the previous line
+            pending += line[3:]
+            continue
+        if pending is not None:
+            yield from _clean(pending)
+        pending = line
+    if pending is not None:
+        yield from _clean(pending)
+
+
+def _clean(line):
+    if line.startswith("## ") and len(line.split("-")) <= 3:
+        line = line.strip() + " - 1970-01-01"
+    if line.startswith("#") or line.startswith("-"):
+        yield line
+
+
+def heading_version(line):
+    release_line = line[3:].lower().strip(" ")
+    return unlink(release_line.split(" ", maxsplit=1)[0])
+
+
+def parse(lines, stop_at=None):
+    """
+    Parse normalized changelog lines into the same dict keepachangelog.to_dict builds
+
+    Stops reading at the "## " heading of stop_at, returns (changes, stopped)
+    """
+    stop_at = str(stop_at).lower() if stop_at else None
+    changes = {}
+    current_release = {}
+    category = []
+    stopped = False
+    for line in lines:
+        line = line.strip(" \n")
+
+        if is_release(line):
+            if stop_at is not None and heading_version(line) == stop_at:
+                stopped = True
+                break
+            current_release = add_release(changes, line)
+            category = current_release.setdefault("uncategorized", [])
+        elif is_category(line):
+            category = add_category(current_release, line)
+        elif line:
+            add_information(category, line)
+
+    for version, current_release in list(changes.items()):
+        if not current_release.get("uncategorized"):
+            current_release.pop("uncategorized", None)
+        # an empty release date identifies the unreleased section
+        if not current_release["metadata"].get("release_date"):
+            changes.pop(version)
+
+    return changes, stopped
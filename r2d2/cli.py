@@ -1,3 +1,4 @@
+import argparse
 import importlib.resources
 import json
 import os
@@ -5,58 +6,153 @@ import shutil
 from pathlib import Path
 from shutil import copy2
 
-import inquirer
-from pyfiglet import Figlet
 from ruamel.yaml import YAML
 
 from .console import Console
-from .gitlab import BigBangRepo1
-from .readme import build_release_notes
-from .repo import BigBangRepo
-
-setup_questions = [
-    inquirer.Password(
-        "repo1_token",
-        message="Enter your personal access token for repo1.dso.mil",
-        validate=lambda _, x: len(x) > 0 and x.startswith("repo1"),
-    ),
-    inquirer.Text(
-        "bb_path",
-        message="Enter the relative path to your cloned Big Bang repo",
-        default="../bigbang",
-    ),
-    # {
-    #     "type": "list",
-    #     "name": "release_type",
-    #     "message": "What type of release?",
-    #     "choices": [
-    #         "major",
-    #         "minor",
-    #         "patch",
-    #     ],
-    #     "default": "minor",
-    # },
-]
-
-config_questions = [
-    inquirer.Checkbox(
-        "steps",
-        message="What would you like to do?",
-        choices=[
-            "Check last release SHAs",
-            "Create release branch",
-            "Build release notes",
-            "Upgrade version references",
-        ],
-    ),
-]
-
-
-def cli():
-    console = Console()
-    t = Figlet(font="slant")
-    print(console.term.green_bold(t.renderText("R2-D2")))
+from .profiling import profiler
+
+# heavy deps (inquirer, pyfiglet, gitlab, git, docker, jinja2, ...) are imported inside the steps that use them,
+# run benchmarks/bench_import.py after adding module level imports here
+
+
+def setup_questions():
+    import inquirer
+
+    return [
+        inquirer.Password(
+            "repo1_token",
+            message="Enter your personal access token for repo1.dso.mil",
+            validate=lambda _, x: len(x) > 0 and x.startswith("repo1"),
+        ),
+        inquirer.Text(
+            "bb_path",
+            message="Enter the relative path to your cloned Big Bang repo",
+            default="../bigbang",
+        ),
+        # {
+        #     "type": "list",
+        #     "name": "release_type",
+        #     "message": "What type of release?",
+        #     "choices": [
+        #         "major",
+        #         "minor",
+        #         "patch",
+        #     ],
+        #     "default": "minor",
+        # },
+    ]
+
+
+def config_questions():
+    import inquirer
+
+    return [
+        inquirer.Checkbox(
+            "steps",
+            message="What would you like to do?",
+            choices=[
+                "Check last release SHAs",
+                "Create release branch",
+                "Build release notes",
+                "Upgrade version references",
+            ],
+        ),
+    ]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="r2d2", description="Big Bang release interactive CLI"
+    )
+    parser.add_argument(
+        "--no-banner", action="store_true", help="skip the R2-D2 banner"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="write step timings + HTTP metrics to ./r2d2-profile.json and a Chrome trace to ./r2d2-trace.json",
+    )
+    parser.add_argument(
+        "-q",
+        "--quiet",
+        action="store_true",
+        help="only print warnings, errors and prompts (implies --no-banner)",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    cache_parser = subparsers.add_parser(
+        "cache", help="inspect or prune the package metadata cache"
+    )
+    cache_parser.add_argument("action", choices=["stats", "prune"])
+
+    batch_parser = subparsers.add_parser(
+        "batch",
+        help="non-interactively build release notes for every release in a tag range",
+    )
+    batch_parser.add_argument(
+        "--from", dest="from_tag", required=True, help="oldest release, e.g. 1.30.0"
+    )
+    batch_parser.add_argument(
+        "--to", dest="to_tag", required=True, help="newest release, e.g. 1.34.0"
+    )
+
+    subparsers.add_parser(
+        "prefetch",
+        help="download every package chart + changelog the next release notes need into the cache",
+    )
+
+    subparsers.add_parser(
+        "plan",
+        help="dry run: list new/changed/unchanged/removed packages and what the next release notes would fetch",
+    )
+
+    subparsers.add_parser(
+        "fleet",
+        help="build the next release notes of every `fleet` target in ~/.r2d2/config.yaml in parallel",
+    )
+
+    watch_parser = subparsers.add_parser(
+        "watch",
+        help="keep the next release notes current, re-rendering them when the release branch or MRs change",
+    )
+    watch_parser.add_argument(
+        "--interval",
+        type=float,
+        help="seconds between polls (default: watch_interval in ~/.r2d2/config.yaml, 15)",
+    )
+
+    return parser.parse_args(argv)
+
 
+def cache_cli(action, console):
+    from .cache import configure_cache, prune
+
+    config_path = Path.home().joinpath(".r2d2/config.yaml")
+    config = YAML().load(config_path.open()) if config_path.exists() else {}
+    cache = configure_cache(config)
+
+    if action == "prune":
+        evicted = prune()
+        console.success(
+            f"Evicted {evicted['packages']} packages, {evicted['responses']} API responses"
+            f" + {evicted['entries']} entries from {cache.path}"
+        )
+
+    stats = cache.stats()
+    console.info(f"Cache: {stats['path']}")
+    console.log(f":package: Packages: {stats['packages']}")
+    console.log(f":scroll: Changelog versions: {stats['changelog_versions']}")
+    console.log(f":satellite: API responses: {stats['responses']}")
+    console.log(f":card_index: Other entries: {stats['entries']}")
+    console.log(
+        f":floppy_disk: Size on disk: {stats['file_size'] / 1024 / 1024:.2f} MB"
+    )
+
+
+def load_config(console):
+    """
+    Read ~/.r2d2/config.yaml, prompting for the token + Big Bang path on the first run
+    """
     is_first_run = not Path.home().joinpath(".r2d2/config.yaml").exists()
 
     resources_path = importlib.resources.files(__package__)
@@ -70,7 +166,7 @@ def cli():
         copy2(base_config_path, config_path)
 
         config_from_yaml = YAML().load(base_config_path.open())
-        setup = console.prompt(setup_questions)
+        setup = console.prompt(setup_questions())
         if "repo1_token" not in setup or "bb_path" not in setup:
             shutil.rmtree(Path.home().joinpath(".r2d2"))
             exit()
@@ -82,134 +178,584 @@ def cli():
         config_from_yaml = YAML().load(config_path.open())
         console.info("Using cached creds+config from ~/.r2d2/config.yaml")
 
-    if config_from_yaml["interactive"] is True:
-        config = {
-            **console.prompt(config_questions),
-            **config_from_yaml,
-        }
-    else:
-        config = config_from_yaml
+    return config_from_yaml
+
+
+def connect(config, console):
+    """
+    Set up the shared cache + HTTP session, open the local Big Bang repo and authenticate w/ Repo1
+    """
+    configure(config)
+    repo = open_repo(config)
+    repo1 = authenticate(config, console)
+    return repo1, repo
+
+
+def configure(config):
+    """
+    Set up the shared cache + HTTP session
+    """
+    from .cache import configure_cache, prune
+    from .session import configure_session
+
+    configure_cache(config)
+    prune()
+    configure_session(config)
 
-    if len(config["steps"]) == 0:
-        console.error("You must use spacebar to select/deselect the steps you want to run.")
-        console.error("Then hit ENTER to run the selected steps.")
-        exit()
 
+def open_repo(config):
+    from .repo import BigBangRepo
+
+    return BigBangRepo(
+        bb_path=config["bb_path"], git_sync=config.get("git_sync", "minimal")
+    )
+
+
+def authenticate(config, console):
+    from .gitlab import BigBangRepo1
+
+    # another GitLab instance or Big Bang project, e.g. a fleet target's fork
+    target = {
+        arg: config[key]
+        for arg, key in (("url", "repo1_url"), ("bb_id", "bb_id"))
+        if config.get(key) is not None
+    }
     repo1 = BigBangRepo1(
         token=config["repo1_token"],
         release_type=config["release_type"],
+        **target,
     )
 
-    repo = BigBangRepo(bb_path=config["bb_path"])
-
-    console.is_interactive = config["interactive"]
-    console.log_level = config["log_level"]
-
     console.spinner.start("Authenticating with Repo1")
-    is_authenticated = repo1.authenticate()
+    with profiler.span("auth"):
+        is_authenticated = repo1.authenticate()
     if is_authenticated is False:
         console.spinner.fail(console.term.red("Auth failed, invalid token"))
         exit(1)
     console.spinner.succeed(console.term.green("Authenticated"))
 
-    if console.log_level == "debug":
-        console.spinner.start("Calculating last and next release tags")
-        repo1.calculate_release_tags()
-        console.spinner.succeed(
-            console.term.green("Calculated last and next release tags")
+    return repo1
+
+
+def fetch_release_pkgs(repo1, pkgs, pkgs_last_release, config):
+    """
+    Download every chart (+ changelog of changed pkgs) missing from the package cache, returns (missing, {name: data})
+    """
+    from .pkgs import get_pkgs_data, plan_fetches, plan_pkgs, uncached_pkgs
+
+    # charts for every table row, changelogs only for changed pkgs, as in build_release_notes
+    since, changelogs = plan_fetches(plan_pkgs(pkgs, pkgs_last_release))
+    missing = uncached_pkgs(pkgs, since, changelogs)
+    with profiler.span("fetch_pkgs", packages=len(missing)):
+        pkgs_data = get_pkgs_data(
+            missing,
+            since=since,
+            max_workers=config.get("fetch_concurrency", 8),
+            repo1=repo1,
+            backend=config.get("fetch_backend", "graphql"),
+            batch_size=config.get("graphql_batch_size", 20),
+            changelogs=changelogs,
         )
-        console.log(":point_right: Last release branch: " + repo1.last_release_tag_x)
-        console.log(
-            ":point_right: Last release tag: "
-            + json.dumps(repo1.last_release_tag.to_dict())
+    return missing, pkgs_data
+
+
+def calculate_release_tags(repo1, repo, config):
+    """
+    Last + next release tags from the tags of the local clone, or the repo1 releases API w/ `release_tags: "api"`
+    (or when the clone has no release tags)
+    """
+    if config.get("release_tags", "local") == "local":
+        # new tags only, skipped when ls-remote shows the local ones are current
+        repo.sync(["master"], tags=True)
+        last_release_tag = repo.tag_index().last_release()
+        if last_release_tag is not None:
+            repo1.calculate_release_tags(last_release_tag)
+            return
+    repo1.calculate_release_tags()
+
+
+def release_pkgs(repo1, repo, config, console):
+    """
+    Resolve the next release like the release steps do, returns (pkgs, pkgs_last_release)
+
+    Ahead of release day the release branch usually doesn't exist yet, the packages are read from master instead
+    """
+    with profiler.span("calculate_release_tags"):
+        calculate_release_tags(repo1, repo, config)
+    release_branch = f"release-{repo1.next_release_tag_x}"
+    repo1.set_release_branch(release_branch)
+    # same API calls as the release steps, cached in the response cache
+    repo1.get_branch(f"release-{repo1.last_release_tag_x}")
+    ref = release_branch
+    if not repo1.get_branch(release_branch):
+        console.warning(
+            f"Release branch '{release_branch}' not found, reading the next release's packages from master"
         )
-        console.log(":point_right: Next release branch: " + repo1.next_release_tag_x)
-        console.log(
-            ":point_right: Next release tag: "
-            + json.dumps(repo1.next_release_tag.to_dict())
+        ref = "master"
+    repo.sync(["master", release_branch, str(repo1.last_release_tag)])
+
+    with profiler.span("get_pkgs", ref=ref):
+        pkgs = repo.get_pkgs(ref=ref)
+    with profiler.span("get_pkgs", ref=repo1.last_release_tag):
+        pkgs_last_release = repo.get_pkgs(ref=str(repo1.last_release_tag))
+    return pkgs, pkgs_last_release
+
+
+def batch_cli(from_tag, to_tag, console):
+    """
+    Build release notes for each consecutive pair of releases between from_tag and to_tag
+
+    All releases share one Repo1 session, the package cache and the values.yaml memo of the local repo
+    """
+    import semver
+
+    from .readme import build_release_notes
+
+    config = load_config(console)
+    console.is_interactive = False
+    console.log_level = config["log_level"]
+
+    repo1, repo = connect(config, console)
+
+    repo.sync(["master"], tags=True)
+
+    from_tag = semver.VersionInfo.parse(from_tag)
+    to_tag = semver.VersionInfo.parse(to_tag)
+    tags = [tag for tag in repo.get_release_tags() if from_tag <= tag <= to_tag]
+    if len(tags) < 2:
+        console.error(f"Need at least 2 releases between {from_tag} and {to_tag}")
+        exit(1)
+
+    for last_release_tag, next_release_tag in zip(tags, tags[1:]):
+        console.info(
+            f":scroll: Building release notes {last_release_tag} -> {next_release_tag}"
+        )
+        repo1.set_release_tags(last_release_tag, next_release_tag)
+        with profiler.span("build_release_notes", release=next_release_tag):
+            build_release_notes(
+                repo1=repo1,
+                current_pkgs=repo.get_pkgs(ref=str(next_release_tag)),
+                previous_pkgs=repo.get_pkgs(ref=str(last_release_tag)),
+                console=console,
+                config=config,
+            )
+
+
+def prefetch_cli(console):
+    """
+    Warm the package cache + Repo1 API responses for the next release, so the real run can work offline
+    """
+    config = load_config(console)
+    console.is_interactive = False
+    console.log_level = config["log_level"]
+
+    repo1, repo = connect(config, console)
+    pkgs, pkgs_last_release = release_pkgs(repo1, repo, config, console)
+
+    console.spinner.start(f"Fetching {len(pkgs)} package charts + changelogs")
+    missing, pkgs_data = fetch_release_pkgs(repo1, pkgs, pkgs_last_release, config)
+    # the REST pages are what an offline run falls back to
+    with profiler.span("get_completed_mrs"):
+        list(repo1.get_completed_mrs(backend="raw"))
+    failed = [name for name, data in pkgs_data.items() if data is None]
+    console.spinner.succeed(console.term.green("Fetched package charts + changelogs"))
+
+    console.info(f"Release: {repo1.last_release_tag} -> {repo1.next_release_tag}")
+    console.log(f":package: Already cached: {len(pkgs) - len(missing)}")
+    console.log(f":inbox_tray: Fetched: {len(missing) - len(failed)}")
+    for name in failed:
+        console.error(f"{name}@{missing[name]['tag']} could not be fetched")
+
+
+def plan_cli(console):
+    """
+    Dry run: print what the next release notes fetch for each package, w/o downloading anything
+    """
+    from tabulate import tabulate
+
+    from .pkgs import plan_fetches, plan_pkgs, uncached_pkgs
+
+    config = load_config(console)
+    console.is_interactive = False
+    console.log_level = config["log_level"]
+
+    repo1, repo = connect(config, console)
+    pkgs, pkgs_last_release = release_pkgs(repo1, repo, config, console)
+
+    plan = plan_pkgs(pkgs, pkgs_last_release)
+    since, changelogs = plan_fetches(plan)
+    missing = uncached_pkgs(pkgs, since, changelogs)
+
+    rows = []
+    for name, entry in plan.items():
+        if entry["status"] == "removed":
+            fetches, cached = "-", "-"
+        else:
+            fetches = "chart + changelog" if entry["changelog"] else "chart"
+            cached = "no" if name in missing else "yes"
+        rows.append(
+            [
+                name,
+                entry["status"],
+                entry["previous_tag"] or "-",
+                entry["tag"] or "-",
+                fetches,
+                cached,
+            ]
+        )
+
+    console.info(f"Release: {repo1.last_release_tag} -> {repo1.next_release_tag}")
+    console.print(
+        tabulate(
+            rows,
+            headers=[
+                "Package",
+                "Status",
+                str(repo1.last_release_tag),
+                str(repo1.next_release_tag),
+                "Fetches",
+                "Cached",
+            ],
+        )
+    )
+    console.log(
+        f":inbox_tray: {len(missing)} to fetch, {len(changelogs)} changelogs of {len(plan)} packages"
+    )
+
+
+def fleet_cli(console):
+    """
+    Release notes for every `fleet` target of the config, side by side in a process pool
+    """
+    from .cache import configure_cache, prune
+    from .fleet import run_fleet, summary_table, targets
+
+    config = load_config(console)
+    console.is_interactive = False
+
+    try:
+        configs = targets(config)
+    except ValueError as e:
+        console.error(str(e))
+        exit(1)
+    if not configs:
+        console.error("No fleet targets in ~/.r2d2/config.yaml")
+        exit(1)
+
+    # once, before the workers share the cache
+    configure_cache(config)
+    prune()
+
+    console.spinner.start(f"Preparing {len(configs)} releases")
+    summaries = run_fleet(
+        configs,
+        fleet_dir=Path.cwd().joinpath("fleet"),
+        max_workers=config.get("fleet_concurrency", 4),
+    )
+    failed = [summary for summary in summaries if summary["status"] != "ok"]
+    if failed:
+        console.spinner.fail(
+            console.term.red(f"{len(failed)} of {len(summaries)} releases failed")
         )
     else:
-        console.spinner.start("Calculating last and next release tags")
-        repo1.calculate_release_tags()
         console.spinner.succeed(
-            console.term.green("Calculated last and next release tags")
+            console.term.green(f"Prepared {len(summaries)} releases in ./fleet/")
         )
+    console.print(summary_table(summaries))
+    if failed:
+        exit(1)
 
-    if "Check last release SHAs" in config["steps"]:
-        check = repo1.check_last_release()
-        if isinstance(check, Exception):
-            console.error(str(check))
+
+def watch_cli(interval, console):
+    """
+    Re-render the next release notes whenever the release branch or its milestone MRs change, until Ctrl+C
+    """
+    from .watch import Watcher
+
+    config = load_config(console)
+    console.is_interactive = False
+    console.log_level = config["log_level"]
+    # revalidate the MR pages w/ their ETags on every poll (as the branch already is), not once a minute
+    http_cache = dict(config.get("http_cache") or {})
+    http_cache["ttl"] = {**(http_cache.get("ttl") or {}), "merge_requests": 0}
+    config["http_cache"] = http_cache
+
+    repo1, repo = connect(config, console)
+    with profiler.span("calculate_release_tags"):
+        calculate_release_tags(repo1, repo, config)
+    repo1.set_release_branch(f"release-{repo1.next_release_tag_x}")
+
+    interval = interval or config.get("watch_interval", 15)
+    console.info(
+        f"Watching {repo1.release_branch} + the {repo1.next_release_tag} MRs every {interval}s, Ctrl+C to stop"
+    )
+    # a line per step, like the release steps: a halo animation per package slows every re-render down
+    console.concurrent = True
+    try:
+        Watcher(repo1, repo, console, config).run(interval)
+    except KeyboardInterrupt:
+        console.info("Stopped watching")
+
+
+def cli(argv=None):
+    from gitlab.exceptions import GitlabAuthenticationError
+
+    args = parse_args(argv)
+    console = Console()
+    console.is_quiet = args.quiet
+    profiler.enabled = args.profile
+
+    try:
+        if args.command == "cache":
+            cache_cli(args.action, console)
+        elif args.command == "batch":
+            batch_cli(args.from_tag, args.to_tag, console)
+        elif args.command == "prefetch":
+            prefetch_cli(console)
+        elif args.command == "plan":
+            plan_cli(console)
+        elif args.command == "fleet":
+            fleet_cli(console)
+        elif args.command == "watch":
+            watch_cli(args.interval, console)
         else:
-            console.success("Last release SHAs match")
-        console.confirm(default=not bool(check))
+            release_cli(args, console)
+    except GitlabAuthenticationError:
+        # the token was revoked or expired after authenticate checked it
+        console.error("Auth failed, invalid token")
+        exit(1)
+    finally:
+        if args.profile:
+            profiler.write()
+            console.info("Profile written to ./r2d2-profile.json + ./r2d2-trace.json")
+
+
+def release_cli(args, console):
+    if not (args.no_banner or args.quiet):
+        from pyfiglet import Figlet
+
+        t = Figlet(font="slant")
+        print(console.term.green_bold(t.renderText("R2-D2")))
+
+    config_from_yaml = load_config(console)
 
+    if config_from_yaml["interactive"] is True:
+        config = {
+            **console.prompt(config_questions()),
+            **config_from_yaml,
+        }
+    else:
+        config = config_from_yaml
+
+    if len(config["steps"]) == 0:
+        console.error(
+            "You must use spacebar to select/deselect the steps you want to run."
+        )
+        console.error("Then hit ENTER to run the selected steps.")
+        exit()
+
+    console.is_interactive = config["interactive"]
+    console.log_level = config["log_level"]
+
+    from .scheduler import Scheduler
+
+    configure(config)
+    scheduler = Scheduler(console)
+
+    # local git work + Repo1 calls run side by side, each step starts as soon as its inputs are ready
+    scheduler.add(
+        "open_repo",
+        lambda: open_repo(config),
+        provides="repo",
+        label="Opened local Big Bang repo",
+    )
+    scheduler.add(
+        "auth",
+        lambda: authenticate(config, console),
+        provides="repo1",
+    )
+
+    def release_tags(repo1, repo):
+        calculate_release_tags(repo1, repo, config)
+        console.debug("Last release branch: " + repo1.last_release_tag_x)
+        console.debug(
+            "Last release tag: " + json.dumps(repo1.last_release_tag.to_dict())
+        )
+        console.debug("Next release branch: " + repo1.next_release_tag_x)
+        console.debug(
+            "Next release tag: " + json.dumps(repo1.next_release_tag.to_dict())
+        )
+        return True
+
+    scheduler.add(
+        "calculate_release_tags",
+        release_tags,
+        requires=["repo1", "repo"],
+        provides="tags",
+        label="Calculated last and next release tags",
+    )
+
+    # only the refs this run reads, skipped when they're already current
+    scheduler.add(
+        "sync_repo",
+        lambda repo1, repo, tags: repo.sync(
+            [
+                "master",
+                f"release-{repo1.next_release_tag_x}",
+                str(repo1.last_release_tag),
+            ]
+        ),
+        requires=["repo1", "repo", "tags"],
+        provides="synced",
+        label="Synced local Big Bang repo",
+    )
+
+    release_branch_requires = ["repo1", "repo", "tags"]
     if "Create release branch" in config["steps"]:
-        branch_exists = repo1.get_branch(f"release-{repo1.next_release_tag_x}")
-        if branch_exists:
-            repo.pull()
-            repo1.set_release_branch(f"release-{repo1.next_release_tag_x}")
-        else:
-            console.warn(
-                f"Creating release branch 'release-{repo1.next_release_tag_x}'"
-            )
+        # a new branch is fetched right after it's created
+        release_branch_requires.append("synced")
+    if "Check last release SHAs" in config["steps"]:
+
+        def check_last_release(repo1, tags):
+            check = repo1.check_last_release()
+            if isinstance(check, Exception):
+                console.error(str(check))
+            else:
+                console.success("Last release SHAs match")
+            console.confirm(default=not isinstance(check, Exception))
+            return True
+
+        scheduler.add(
+            "check_last_release",
+            check_last_release,
+            requires=["repo1", "tags"],
+            provides="checked",
+            exclusive=True,
+            label="Checked last release SHAs",
+        )
+        # prompts stay in the same order
+        release_branch_requires.append("checked")
+
+    def release_branch(repo1, repo, tags, checked=None, synced=None):
+        name = f"release-{repo1.next_release_tag_x}"
+        # a release branch already in the clone needs no API call
+        exists = repo.tag_index().branch_for(repo1.next_release_tag) == name
+        if not exists and not repo1.get_branch(name):
+            if "Create release branch" not in config["steps"]:
+                # if we don't select to create a release branch, we still need to calculate it
+                console.error(f"Release branch '{name}' not found.")
+                exit()
+            console.warning(f"Creating release branch '{name}'")
             are_you_sure = console.confirm()
             if are_you_sure is False:
                 console.error("Aborting")
                 exit()
-            repo.create_branch(f"release-{repo1.next_release_tag_x}")
-    else:
-        # if we don't select to create a release branch, we still need to calculate it
-        if not repo1.get_branch(f"release-{repo1.next_release_tag_x}"):
-            console.error(
-                f"Release branch 'release-{repo1.next_release_tag_x}' not found."
-            )
-            exit()
-        else:
-            repo1.set_release_branch(f"release-{repo1.next_release_tag_x}")
+            repo1.create_branch(name)
+            repo.sync([name])
+        repo1.set_release_branch(name)
+        return name
+
+    scheduler.add(
+        "release_branch",
+        release_branch,
+        requires=release_branch_requires,
+        provides="release_branch",
+        # may prompt before creating the branch
+        exclusive="Create release branch" in config["steps"],
+        label="Found release branch",
+    )
 
     if "Build release notes" in config["steps"]:
-        console.info(f":scroll: Building release notes")
-        console.info(f"From BB version: {repo1.last_release_tag}")
-        console.info(f"To BB version: {repo1.next_release_tag}")
-        console.info(f"Release Branch: {repo1.release_branch}")
+        from .readme import build_release_notes
 
-        console.spinner.start(f"Checking out {repo1.release_branch}")
-        repo.checkout(repo1.release_branch)
-        console.spinner.succeed(
-            console.term.green(f"Switched to branch {repo1.release_branch}")
-        )
-
-        console.success(f"Getting packages from branch {repo1.release_branch}")
-        pkgs = repo.get_pkgs()
+        def get_pkgs(repo1, repo, release_branch, synced):
+            # one step, both reads share the repo's git object reader
+            return (
+                repo.get_pkgs(ref=release_branch),
+                repo.get_pkgs(ref=str(repo1.last_release_tag)),
+            )
 
-        console.spinner.start(f"Checking out {str(repo1.last_release_tag)}")
-        repo.checkout(str(repo1.last_release_tag))
-        console.spinner.succeed(
-            console.term.green(f"Switched to branch {str(repo1.last_release_tag)}")
+        scheduler.add(
+            "get_pkgs",
+            get_pkgs,
+            requires=["repo1", "repo", "release_branch", "synced"],
+            provides=("pkgs", "pkgs_last_release"),
+            label="Read packages of the release branch + last release tag",
+        )
+        scheduler.add(
+            "fetch_pkgs",
+            lambda repo1, pkgs, pkgs_last_release: fetch_release_pkgs(
+                repo1, pkgs, pkgs_last_release, config
+            ),
+            requires=["repo1", "pkgs", "pkgs_last_release"],
+            provides="fetched",
+            label="Fetched package charts + changelogs",
+        )
+        # only the fields the release notes use, small enough to hold while the packages download
+        scheduler.add(
+            "get_completed_mrs",
+            lambda repo1, tags: list(
+                repo1.get_completed_mrs(backend=config.get("fetch_backend", "graphql"))
+            ),
+            requires=["repo1", "tags"],
+            provides="mrs",
+            label="Listed merged MRs",
         )
 
-        console.success(f"Getting packages from tag {repo1.last_release_tag}")
-        pkgs_last_release = repo.get_pkgs()
-
-        repo.checkout(repo1.release_branch)
+        def release_notes(repo1, pkgs, pkgs_last_release, fetched, mrs):
+            console.info(f":scroll: Building release notes")
+            console.info(f"From BB version: {repo1.last_release_tag}")
+            console.info(f"To BB version: {repo1.next_release_tag}")
+            console.info(f"Release Branch: {repo1.release_branch}")
+            build_release_notes(
+                repo1=repo1,
+                current_pkgs=pkgs,
+                previous_pkgs=pkgs_last_release,
+                console=console,
+                config=config,
+                mr_changes=mrs,
+            )
 
-        build_release_notes(
-            repo1=repo1,
-            current_pkgs=pkgs,
-            previous_pkgs=pkgs_last_release,
-            console=console,
-            config=config,
+        scheduler.add(
+            "build_release_notes",
+            release_notes,
+            requires=["repo1", "pkgs", "pkgs_last_release", "fetched", "mrs"],
+            label="Built release notes",
         )
 
     if "Upgrade version references" in config["steps"]:
-        repo.checkout(repo1.release_branch)
-        console.spinner.start("Upgrading version refs on local Big Bang repo")
-        repo.update_base_gitrepository_yaml(str(repo1.next_release_tag))
-        repo.update_chart_release_version(str(repo1.next_release_tag))
-        repo.run_helm_docs()
-        console.spinner.succeed(
-            console.term.green("Version refs upgraded on local Big Bang repo")
+        scheduler.add(
+            "checkout",
+            lambda repo, release_branch, synced: repo.checkout(release_branch),
+            # package reads go through git objects, the checkout doesn't need to wait for them
+            requires=["repo", "release_branch", "synced"],
+            provides="checked_out",
+            label="Checked out the release branch",
+        )
+
+        def upgrade_version_refs(repo1, repo, checked_out):
+            from .bump import VERSION_REFS
+
+            for path in repo.bump_version(
+                repo1.next_release_tag,
+                refs=VERSION_REFS + list(config.get("version_refs") or []),
+            ):
+                console.debug(f"Bumped {path} to {repo1.next_release_tag}")
+            with profiler.span("helm_docs"):
+                repo.run_helm_docs(runner=config.get("helm_docs_runner", "auto"))
+
+        scheduler.add(
+            "upgrade_version_refs",
+            upgrade_version_refs,
+            requires=["repo1", "repo", "checked_out"],
+            provides="upgraded",
+            label="Version refs upgraded on local Big Bang repo",
         )
+
+    values = scheduler.run()
+
+    if "upgraded" in values:
+        repo1 = values["repo1"]
         console.warning(
             "ALERT: Please review the changes to your local Big Bang and commit if correct"
         )
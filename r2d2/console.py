@@ -1,62 +1,120 @@
+import threading
 from dataclasses import dataclass
 
-import emoji
-import inquirer
 from blessed import Terminal
-from halo import Halo
 
 
-class PromptTheme(inquirer.themes.Theme):
-    def __init__(self):
-        super().__init__()
-        term = Terminal()
-        self.Question.mark_color = term.blue
-        self.Question.brackets_color = term.goldenrod1
-        self.Question.default_color = term.blue
+def prompt_theme():
+    # inquirer is slow to import, only pay for it when prompting
+    import inquirer
 
-        self.Checkbox.selection_color = term.bold_goldenrod1
-        self.Checkbox.selection_icon = "❯"
-        self.Checkbox.selected_icon = "◉"
-        self.Checkbox.unselected_icon = "◯"
-        self.Checkbox.selected_color = term.seagreen2
-        self.Checkbox.unselected_color = term.normal
+    class PromptTheme(inquirer.themes.Theme):
+        def __init__(self):
+            super().__init__()
+            term = Terminal()
+            self.Question.mark_color = term.blue
+            self.Question.brackets_color = term.goldenrod1
+            self.Question.default_color = term.blue
 
-        self.List.selection_color = term.bold_goldenrod1
-        self.List.selection_cursor = "❯"
-        self.List.unselected_color = term.normal
+            self.Checkbox.selection_color = term.bold_goldenrod1
+            self.Checkbox.selection_icon = "❯"
+            self.Checkbox.selected_icon = "◉"
+            self.Checkbox.unselected_icon = "◯"
+            self.Checkbox.selected_color = term.seagreen2
+            self.Checkbox.unselected_color = term.normal
+
+            self.List.selection_color = term.bold_goldenrod1
+            self.List.selection_cursor = "❯"
+            self.List.unselected_color = term.normal
+
+    return PromptTheme()
+
+
+class LineSpinner:
+    """
+    Stand-in for the halo spinner while steps run side by side: no animation, only the final line is printed
+    """
+
+    def __init__(self, console):
+        self.console = console
+
+    def start(self, text=None):
+        return self
+
+    def stop(self):
+        return self
+
+    def succeed(self, text=None):
+        if text:
+            self.console.success(text)
+        return self
+
+    def fail(self, text=None):
+        if text:
+            self.console.error(text)
+        return self
 
 
 @dataclass
 class Console:
     is_interactive = False
+    is_quiet = False
+    # set by the step scheduler while steps run concurrently
+    concurrent = False
     term = Terminal()
     log_level = "info"
-    spinner = Halo(spinner="dots")
+    _spinner = None
+    _lock = threading.Lock()
+
+    @property
+    def spinner(self):
+        if self.concurrent:
+            return LineSpinner(self)
+        if Console._spinner is None:
+            from halo import Halo
+
+            Console._spinner = Halo(spinner="dots", enabled=not self.is_quiet)
+        return Console._spinner
 
     def emoji(self, message):
+        import emoji
+
         return emoji.emojize(message, use_aliases=True)
 
+    def print(self, message):
+        # one line at a time, whichever thread is printing
+        with Console._lock:
+            print(message)
+
     def success(self, message):
-        print(self.term.green("✔ " + message))
+        if self.is_quiet:
+            return
+        self.print(self.term.green("✔ " + message))
 
     def error(self, message):
-        print(self.term.red(self.emoji(":multiply:  " + message)))
+        self.print(self.term.red(self.emoji(":multiply:  " + message)))
 
     def info(self, message):
-        print(self.term.blue(self.emoji(":information:  " + message)))
+        if self.is_quiet:
+            return
+        self.print(self.term.blue(self.emoji(":information:  " + message)))
 
     def warning(self, message):
-        print(self.term.yellow(self.emoji(":warning:  " + message)))
+        self.print(self.term.yellow(self.emoji(":warning:  " + message)))
 
     def debug(self, message):
-        if self.log_level == "debug":
-            print(self.term.magenta(self.emoji(":crystal_ball:  " + message)))
+        if self.log_level == "debug" and not self.is_quiet:
+            self.print(self.term.magenta(self.emoji(":crystal_ball:  " + message)))
 
     def log(self, message):
-        print(self.emoji(message))
+        if self.is_quiet:
+            return
+        self.print(self.emoji(message))
+
+    def prompt(self, questions, theme=None):
+        import inquirer
 
-    def prompt(self, questions, theme=PromptTheme()):
-        return inquirer.prompt(questions, theme=theme)
+        return inquirer.prompt(questions, theme=theme or prompt_theme())
 
     def confirm(self, default=False, message="Continue?"):
         if self.is_interactive == False:
@@ -67,6 +125,8 @@ class Console:
                 exit()
             return True
 
+        import inquirer
+
         continue_prompt = self.prompt(
             [inquirer.Confirm("continue", message=message, default=default)]
         )
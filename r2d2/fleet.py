@@ -0,0 +1,139 @@
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from tabulate import tabulate
+
+from .console import Console
+
+PLAN_STATUSES = ["new", "changed", "unchanged", "removed"]
+SUMMARY_HEADERS = [
+    "Target",
+    "Last release",
+    "Next release",
+    "New",
+    "Changed",
+    "Unchanged",
+    "Removed",
+    "Fetched",
+    "Time",
+    "Status",
+]
+
+
+def targets(config):
+    """
+    The `fleet` entries of config, each merged over the rest of config so a target can override any key
+
+    Raises ValueError when two targets share a name (their ./fleet/<name>/ output) or a bb_path
+    (parallel checkouts + fetches of one clone collide)
+    """
+    base = {key: value for key, value in config.items() if key != "fleet"}
+    merged = []
+    names, paths = {}, {}
+    for i, target in enumerate(config.get("fleet") or []):
+        target = {**base, **target}
+        target.setdefault("name", Path(target["bb_path"]).name or f"target-{i}")
+        path = Path(target["bb_path"]).expanduser().resolve()
+        if target["name"] in names:
+            raise ValueError(
+                f"Fleet targets {names[target['name']]} and {i} are both named '{target['name']}', set a unique name"
+            )
+        if path in paths:
+            raise ValueError(
+                f"Fleet targets '{paths[path]}' and '{target['name']}' share bb_path {path}"
+            )
+        names[target["name"]] = i
+        paths[path] = target["name"]
+        merged.append(target)
+    return merged
+
+
+def run_target(config, fleet_dir):
+    """
+    Tags, package plan + release notes of one target, run in a worker process, returns its summary
+
+    Everything the target prints goes to <fleet_dir>/<name>/r2d2.log, next to its release notes
+    """
+    start = time.perf_counter()
+    summary = {"name": config["name"], "status": "ok"}
+    notes_dir = Path(fleet_dir).joinpath(config["name"])
+    os.makedirs(notes_dir, exist_ok=True)
+    with open(notes_dir.joinpath("r2d2.log"), "w") as log, redirect_stdout(log):
+        try:
+            summary.update(_run_target(config, notes_dir))
+        except (Exception, SystemExit) as e:
+            # SystemExit: the release helpers exit on a dirty repo or a bad token
+            traceback.print_exc(file=log)
+            summary["status"] = f"failed: {type(e).__name__}: {e}, see {log.name}"
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+def _run_target(config, notes_dir):
+    from .cache import configure_cache
+    from .cli import authenticate, fetch_release_pkgs, open_repo, release_pkgs
+    from .pkgs import plan_pkgs
+    from .readme import build_release_notes
+    from .session import configure_session
+
+    console = Console()
+    console.is_interactive = False
+    console.log_level = config["log_level"]
+    # line by line, the log isn't a terminal
+    console.concurrent = True
+
+    # every worker opens the shared sqlite cache, pruning is left to the parent
+    configure_cache(config)
+    configure_session(config)
+    repo = open_repo(config)
+    repo1 = authenticate(config, console)
+
+    pkgs, pkgs_last_release = release_pkgs(repo1, repo, config, console)
+    plan = plan_pkgs(pkgs, pkgs_last_release)
+    missing, _ = fetch_release_pkgs(repo1, pkgs, pkgs_last_release, config)
+    notes_path = build_release_notes(
+        repo1=repo1,
+        current_pkgs=pkgs,
+        previous_pkgs=pkgs_last_release,
+        console=console,
+        config=config,
+        notes_dir=notes_dir,
+    )
+
+    statuses = [entry["status"] for entry in plan.values()]
+    return {
+        "last_release_tag": str(repo1.last_release_tag),
+        "next_release_tag": str(repo1.next_release_tag),
+        "fetched": len(missing),
+        "notes": str(notes_path),
+        **{status: statuses.count(status) for status in PLAN_STATUSES},
+    }
+
+
+def run_fleet(configs, fleet_dir, max_workers=4):
+    """
+    run_target for every target config in a process pool, returns their summaries in config order
+    """
+    with ProcessPoolExecutor(max_workers=max(1, int(max_workers))) as pool:
+        futures = [pool.submit(run_target, config, fleet_dir) for config in configs]
+        return [future.result() for future in futures]
+
+
+def summary_table(summaries):
+    rows = [
+        [
+            summary["name"],
+            summary.get("last_release_tag", "-"),
+            summary.get("next_release_tag", "-"),
+            *[summary.get(status, "-") for status in PLAN_STATUSES],
+            summary.get("fetched", "-"),
+            f"{summary['seconds']:.1f}s",
+            summary["status"],
+        ]
+        for summary in summaries
+    ]
+    return tabulate(rows, headers=SUMMARY_HEADERS)
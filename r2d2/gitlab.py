@@ -1,81 +1,234 @@
 import gitlab
+import requests
 
 # using semver==2.13.0
 import semver
 
+from .session import get_session
+from .tags import next_release, release_tag_x
+
+BLOBS_QUERY = """
+query({variables}) {{
+{projects}
+}}
+"""
+
+BLOBS_PROJECT = """  p{i}: project(fullPath: $path{i}) {{
+    repository {{ blobs(ref: $ref{i}, paths: $paths) {{ nodes {{ path rawBlob }} }} }}
+  }}"""
+
+MERGED_MRS_QUERY = """
+query($path: ID!, $milestone: String, $first: Int, $after: String) {
+  project(fullPath: $path) {
+    mergeRequests(state: merged, milestoneTitle: $milestone, sort: UPDATED_DESC, first: $first, after: $after) {
+      pageInfo { hasNextPage endCursor }
+      nodes { reference webUrl title }
+    }
+  }
+}
+"""
+
 
 class BigBangRepo1:
-    def __init__(self, token, release_type):
+    def __init__(
+        self,
+        token,
+        release_type,
+        session=None,
+        url="https://repo1.dso.mil/",
+        bb_id=2872,
+    ):
         self.token = token
         self.release_type = release_type
-        self.url = "https://repo1.dso.mil/"
-        self.bb_id = 2872
-        self.gl = gitlab.Gitlab(self.url, private_token=self.token)
+        self.url = url
+        self.bb_id = bb_id
+        self.session = session or get_session()
+        self.gl = gitlab.Gitlab(
+            self.url,
+            private_token=self.token,
+            session=self.session,
+            timeout=self.session.timeout,
+        )
+        self._last_release = None
+        self._branches = {}
 
     def authenticate(self):
+        """
+        Check the token against repo1 + load the Big Bang project, False when the token is rejected
+
+        The check always reaches repo1, a cached project response would hide a revoked or expired token
+        """
+        res = self.session.get(
+            f"{self.gl.api_url}/projects/{self.bb_id}",
+            headers={"PRIVATE-TOKEN": self.token, "Cache-Control": "no-cache"},
+        )
+        if res.status_code == 401:
+            return False
         try:
+            # fresh in the response cache now, no second request
             self.repo1 = self.gl.projects.get(self.bb_id)
             return True
         except gitlab.exceptions.GitlabAuthenticationError:
             return False
 
-    def get_completed_mrs(self):
-        return self.repo1.mergerequests.list(
+    def graphql(self, query, variables=None):
+        """
+        POST a query to the GraphQL API of repo1 w/ the token, returns its data
+        """
+        res = self.session.post(
+            self.url.rstrip("/") + "/api/graphql",
+            json={"query": query, "variables": variables or {}},
+            headers={"Authorization": f"Bearer {self.token}"},
+        )
+        res.raise_for_status()
+        return res.json().get("data") or {}
+
+    def get_blobs(self, refs, paths):
+        """
+        Contents of paths in every (project path, ref) of refs, in a single GraphQL request
+
+        Returns [{path: content}] in the same order as refs, None for projects that weren't found
+        """
+        variables = {"paths": paths}
+        for i, (project_path, ref) in enumerate(refs):
+            variables[f"path{i}"] = project_path
+            variables[f"ref{i}"] = ref
+        query = BLOBS_QUERY.format(
+            variables=", ".join(
+                ["$paths: [String!]!"]
+                + [f"$path{i}: ID!, $ref{i}: String!" for i in range(len(refs))]
+            ),
+            projects="\n".join(BLOBS_PROJECT.format(i=i) for i in range(len(refs))),
+        )
+        data = self.graphql(query, variables)
+
+        blobs = []
+        for i in range(len(refs)):
+            project = data.get(f"p{i}")
+            if project is None or project["repository"] is None:
+                blobs.append(None)
+                continue
+            blobs.append(
+                {
+                    node["path"]: node["rawBlob"]
+                    for node in project["repository"]["blobs"]["nodes"]
+                }
+            )
+        return blobs
+
+    def get_completed_mrs(self, backend="graphql", per_page=100):
+        """
+        Lazily iterate the merged MRs of the next release's milestone as {reference, web_url, title}, one page at a time
+
+        The GraphQL backend only asks for the reference, web_url + title the release notes use,
+        the REST pages are used for backend "raw" or when any GraphQL page can't be fetched (they're in the response cache),
+        w/o repeating the MRs already yielded
+        """
+        # yielded by a GraphQL page before a later one failed, skipped by the REST fallback
+        seen = set()
+        if backend == "graphql":
+            after = None
+            while True:
+                try:
+                    page = self._merged_mrs_page(per_page, after)
+                    mrs = [
+                        {
+                            "reference": mr["reference"],
+                            "web_url": mr["webUrl"],
+                            "title": mr["title"],
+                        }
+                        for mr in page["nodes"]
+                    ]
+                    has_next, after = (
+                        page["pageInfo"]["hasNextPage"],
+                        page["pageInfo"]["endCursor"],
+                    )
+                except (requests.RequestException, ValueError, KeyError, TypeError):
+                    break
+                for mr in mrs:
+                    seen.add(mr["reference"])
+                    yield mr
+                if not has_next:
+                    return
+
+        for mr in self.repo1.mergerequests.list(
             state="merged",
             order_by="updated_at",
             milestone=str(self.next_release_tag),
-            all=True,
-        )
+            per_page=per_page,
+            as_list=False,
+        ):
+            if mr.reference not in seen:
+                yield {
+                    "reference": mr.reference,
+                    "web_url": mr.web_url,
+                    "title": mr.title,
+                }
 
-    def calculate_release_tags(self):
-        all_releases = list(
-            filter(
-                lambda tag: "rc" not in tag.tag_name,
-                self.repo1.releases.list(all=True),
-            )
+    def _merged_mrs_page(self, per_page, after=None):
+        data = self.graphql(
+            MERGED_MRS_QUERY,
+            {
+                "path": self.repo1.path_with_namespace,
+                "milestone": str(self.next_release_tag),
+                "first": per_page,
+                "after": after,
+            },
         )
+        return data["project"]["mergeRequests"]
 
-        # calculate last release tag + last release tag x
-        self.last_release = all_releases[0]
-        self.last_release_tag = self.last_release.tag_name
+    def get_last_release(self):
+        """
+        Newest non-rc release, memoized
 
-        self.last_release_tag = semver.VersionInfo.parse(self.last_release_tag)
-        if self.last_release_tag.patch == 0:
-            # was a minor release
-            self.last_release_tag_x = (
-                ".".join(str(self.last_release_tag).split(".")[:2]) + ".x"
+        Releases are streamed newest first in small pages, so only the first page or two are ever downloaded
+        """
+        if self._last_release is None:
+            releases = self.repo1.releases.list(
+                order_by="released_at",
+                sort="desc",
+                per_page=10,
+                as_list=False,
             )
-        elif self.last_release_tag.minor == 0:
-            # was a major release
-            self.last_release_tag_x = str(self.last_release_tag).split(".")[0] + ".x.x"
-        else:
-            # was a patch release
-            self.last_release_tag_x = str(self.last_release_tag)
-
-        # calculate next release tag + next release tag x
-        next_release_tag = ""
-
-        if self.release_type == "major":
-            next_release_tag = self.last_release_tag.bump_major()
-            self.next_release_tag_x = str(next_release_tag).split(".")[0] + ".x.x"
-        elif self.release_type == "minor":
-            next_release_tag = self.last_release_tag.bump_minor()
-            self.next_release_tag_x = (
-                ".".join(str(next_release_tag).split(".")[:2]) + ".x"
+            self._last_release = next(
+                release for release in releases if "rc" not in release.tag_name
             )
-        elif self.release_type == "patch":
-            next_release_tag = self.last_release_tag.bump_patch()
-            self.next_release_tag_x = str(next_release_tag)
-            # idk what to do here lol ^^
+        return self._last_release
 
-        self.next_release_tag = next_release_tag
+    def calculate_release_tags(self, last_release_tag=None):
+        """
+        Last + next release tags and their release branch suffixes
 
-    def get_branch(self, branch_name):
-        try:
-            branch = self.repo1.branches.get(branch_name)
-            return branch
-        except gitlab.exceptions.GitlabGetError:
-            return False
+        last_release_tag comes from the local tag index when given, else from the newest release on repo1
+        """
+        if last_release_tag is None:
+            last_release_tag = self.get_last_release().tag_name
+        self.last_release_tag = semver.VersionInfo.parse(str(last_release_tag))
+        self.last_release_tag_x = release_tag_x(self.last_release_tag)
+        self.next_release_tag, self.next_release_tag_x = next_release(
+            self.last_release_tag, self.release_type
+        )
+
+    def set_release_tags(self, last_release_tag, next_release_tag):
+        """
+        Pin the release pair instead of calculating it from the latest release, used for historical releases
+        """
+        self.last_release_tag = semver.VersionInfo.parse(str(last_release_tag))
+        self.next_release_tag = semver.VersionInfo.parse(str(next_release_tag))
+
+    def get_branch(self, branch_name, refresh=False):
+        """
+        Branch from the repo1 API, memoized unless refresh (revalidated w/ its ETag by the response cache)
+
+        False when it doesn't exist, a rejected token raises GitlabAuthenticationError
+        """
+        if refresh or branch_name not in self._branches:
+            try:
+                self._branches[branch_name] = self.repo1.branches.get(branch_name)
+            except gitlab.exceptions.GitlabGetError:
+                self._branches.pop(branch_name, None)
+                return False
+        return self._branches[branch_name]
 
     def set_release_branch(self, name):
         self.release_branch = name
@@ -87,18 +240,22 @@ class BigBangRepo1:
             )
         except gitlab.exceptions.GitlabCreateError:
             return Exception("Branch already exists")
+        self._branches[branch_name] = release_branch
         self.release_branch = release_branch.name
 
     def check_last_release(self):
-        try:
-            last_release_branch = self.repo1.branches.get(
-                f"release-{self.last_release_tag_x}"
-            )
-        except gitlab.exceptions.GitlabGetError:
+        last_release_branch = self.get_branch(f"release-{self.last_release_tag_x}")
+        if last_release_branch is False:
             return Exception("No release branch found for {self.last_release_tag_x}")
 
-        last_release_commit = self.last_release.commit["short_id"]
-        last_release_author = self.last_release.commit["author_name"]
+        # the one check that still needs the releases API, the tags may come from the local clone
+        last_release = self.get_last_release()
+        if last_release.tag_name != str(self.last_release_tag):
+            return Exception(
+                f"Latest release on repo1 is {last_release.tag_name}, not {self.last_release_tag}"
+            )
+        last_release_commit = last_release.commit["short_id"]
+        last_release_author = last_release.commit["author_name"]
 
         last_release_branch_hash = last_release_branch.commit["short_id"]
 
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import shutil
+import subprocess
+
+HELM_DOCS_IMAGE = "jnorwood/helm-docs:v1.5.0"
+HELM_DOCS_TEMPLATE = ".gitlab/README.md.gotmpl"
+HELM_DOCS_ARGS = ["-s", "file", "-t", HELM_DOCS_TEMPLATE, "--dry-run"]
+
+
+class LocalHelmDocs:
+    """
+    Runs a helm-docs binary found on the PATH
+    """
+
+    def __init__(self, bb_path, binary):
+        self.bb_path = bb_path
+        self.binary = binary
+        self.name = f"local:{binary}"
+
+    def run(self):
+        return subprocess.run(
+            [self.binary, *HELM_DOCS_ARGS],
+            cwd=self.bb_path,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class DockerHelmDocs:
+    """
+    Runs helm-docs in one warm container, started on the first run and reused until closed
+    """
+
+    def __init__(self, bb_path, image=HELM_DOCS_IMAGE):
+        self.bb_path = bb_path
+        self.image = image
+        self.name = f"docker:{image}"
+        self.container = None
+
+    def run(self):
+        if self.container is None:
+            import docker
+
+            self.container = docker.from_env().containers.run(
+                self.image,
+                entrypoint=["tail", "-f", "/dev/null"],
+                volumes=[f"{self.bb_path}:/helm-docs"],
+                # removed by close, auto-removal would race it
+                detach=True,
+            )
+        exit_code, (stdout, stderr) = self.container.exec_run(
+            ["helm-docs", *HELM_DOCS_ARGS], workdir="/helm-docs", demux=True
+        )
+        if exit_code != 0:
+            raise RuntimeError(f"helm-docs failed: {(stderr or b'').decode('utf-8')}")
+        return (stdout or b"").decode("utf-8")
+
+    def close(self):
+        if self.container is not None:
+            import docker
+
+            try:
+                self.container.remove(force=True)
+            except docker.errors.NotFound:
+                # already gone, e.g. docker was restarted
+                pass
+            self.container = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def helm_docs_runner(bb_path, runner="auto"):
+    """
+    runner: "local" (helm-docs on the PATH), "docker" or "auto" (local when available, else docker)
+    """
+    binary = shutil.which("helm-docs")
+    if runner == "local" or (runner == "auto" and binary):
+        if binary is None:
+            raise FileNotFoundError("helm-docs not found on the PATH")
+        return LocalHelmDocs(bb_path, binary)
+    return DockerHelmDocs(bb_path)
+
+
+def content_hash(bb_path, runner):
+    """
+    Hash of everything helm-docs reads to render README.md: the chart dir + the template, and the runner itself
+    """
+    digest = hashlib.sha256(runner.name.encode())
+    chart_path = os.path.join(bb_path, "chart")
+    files = [os.path.join(bb_path, HELM_DOCS_TEMPLATE)]
+    for root, dirs, filenames in os.walk(chart_path):
+        dirs.sort()
+        files.extend(os.path.join(root, filename) for filename in sorted(filenames))
+    for file in files:
+        digest.update(os.path.relpath(file, bb_path).encode())
+        with open(file, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
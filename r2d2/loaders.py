@@ -0,0 +1,11 @@
+from ruamel.yaml import YAML
+
+
+def safe_load(stream):
+    """
+    Read-only YAML parse into plain dicts + lists, w/ the C LibYAML based loader when ruamel.yaml.clib is installed
+
+    Use for files we never write back, round-trip loading is only needed to keep comments + formatting on dump
+    """
+    # YAML instances are not thread safe, get_pkg_data runs in a thread pool
+    return YAML(typ="safe").load(stream)
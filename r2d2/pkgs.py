@@ -1,61 +1,248 @@
-import os
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 
-import keepachangelog
 import requests
-from ruamel.yaml import YAML
 
+from .cache import get_cache
+from .changelog import normalize, parse
+from .loaders import safe_load
+from .profiling import profiler
+from .session import get_session
 
-def get_pkg_data(pkg):
-    cache_dir = Path.home().joinpath(f".r2d2/cache/{pkg['name']}_{pkg['tag']}")
+CHART_PATH = "chart/Chart.yaml"
+CHANGELOG_PATH = "CHANGELOG.md"
 
-    chart_path = cache_dir.joinpath("Chart.yaml")
-    changelog_path = cache_dir.joinpath("CHANGELOG.md")
-    is_cached = Path.exists(chart_path) and Path.exists(changelog_path)
 
-    if is_cached:
-        return {
-            "chart": YAML().load(open(chart_path, "r")),
-            "changelog": keepachangelog.to_dict(changelog_path),
-        }
+def get_pkg_data(pkg, since=None, changelog=True):
+    """
+    Get the parsed Chart.yaml of pkg@tag, downloading + storing its chart and changelog in the package cache on a miss
+
+    The changelog is streamed and only read back to the heading of since (the whole file when None),
+    and skipped altogether when changelog is False
+    """
+    with profiler.span("get_pkg_data", pkg=pkg["name"], tag=pkg["tag"]):
+        return _get_pkg_data(pkg, since, changelog)
+
+
+def _get_pkg_data(pkg, since, changelog):
+    cache = get_cache()
+
+    if cache.get(pkg["repo"], pkg["tag"]) is not None:
+        profiler.count("package_cache.chart.hit")
+    else:
+        profiler.count("package_cache.chart.miss")
+        # get the chart
+        chart_url = f"{pkg['repo'].replace('.git','')}/-/raw/{pkg['tag']}/{CHART_PATH}"
+        chart_res = get_session().get(chart_url)
+        if chart_res.status_code != 200:
+            print(
+                f"\n ERROR: {pkg['name']} {pkg['tag']} Chart not found in repo1.dso.mil ({chart_res.status_code})"
+            )
+            return
+        store_chart(pkg, chart_res.text)
+
+    if not changelog:
+        return cache.get(pkg["repo"], pkg["tag"])
+
+    if cache.has_changelog(pkg["repo"], pkg["tag"], since):
+        profiler.count("package_cache.changelog.hit")
     else:
-        os.makedirs(cache_dir, exist_ok=True)
-
-    # get the chart
-    chart_url = f"{pkg['repo'].replace('.git','')}/-/raw/{pkg['tag']}/chart/Chart.yaml"
-    chart_res = requests.get(chart_url)
-    if chart_res.status_code != 200:
-        print(f"\n ERROR: {pkg['name']} {pkg['tag']} Chart not found in repo1.dso.mil")
-        return
-    chart = chart_res.text
-    chart_path.open("w").write(chart)
-
-    # get the changelog
-    changelog_url = f"{pkg['repo'].replace('.git','')}/-/raw/{pkg['tag']}/CHANGELOG.md"
-    changelog_res = requests.get(changelog_url)
-    if changelog_res.status_code != 200:
-        print(
-            f"\n ERROR: {pkg['name']} {pkg['tag']} CHANGELOG not found in repo1.dso.mil"
+        profiler.count("package_cache.changelog.miss")
+        # get the changelog
+        changelog_url = (
+            f"{pkg['repo'].replace('.git','')}/-/raw/{pkg['tag']}/{CHANGELOG_PATH}"
         )
-        return
-    changelog = changelog_res.text
-    # some fuckery to make our changelogs actually KAC compliant
-    changelog = changelog.replace("\n---", "")
-    clean_changelog = []
-    for line in changelog.split("\n"):
-        if line.startswith("## ") and len(line.split("-")) <= 3:
-            line = line.strip() + " - 1970-01-01"
-        if line.startswith("#") or line.startswith("-"):
-            clean_changelog.append(line)
+        with get_session().get(changelog_url, stream=True) as changelog_res:
+            if changelog_res.status_code != 200:
+                print(
+                    f"\n ERROR: {pkg['name']} {pkg['tag']} CHANGELOG not found in repo1.dso.mil ({changelog_res.status_code})"
+                )
+                return
+            changelog_res.encoding = changelog_res.encoding or "utf-8"
+            # stop downloading once the previous release's heading shows up
+            store_changelog(
+                pkg,
+                changelog_res.iter_lines(chunk_size=8192, decode_unicode=True),
+                since,
+            )
+
+    return cache.get(pkg["repo"], pkg["tag"])
+
+
+def store_chart(pkg, text):
+    get_cache().put_chart(pkg["repo"], pkg["tag"], safe_load(text))
+
+
+def store_changelog(pkg, lines, since):
+    """
+    Parse changelog lines back to the heading of since and store them in the package cache
+    """
+    changelog, stopped = parse(normalize(lines), stop_at=since)
+    get_cache().put_changelog(
+        pkg["repo"],
+        pkg["tag"],
+        changelog,
+        until=str(since).lower() if stopped else None,
+    )
+
+
+def project_path(repo, base_url):
+    """
+    group/project of a package repo URL, None when it isn't hosted on base_url
+    """
+    parts = urlsplit(repo)
+    if parts.netloc != urlsplit(base_url).netloc:
+        return None
+    path = parts.path.strip("/")
+    return path[: -len(".git")] if path.endswith(".git") else path
 
-    changelog = "\n\n".join(clean_changelog)
 
-    changelog_path.open("w").write(changelog)
+def fetch_blobs(repo1, pkgs, since=None, changelogs=None, batch_size=20, max_workers=8):
+    """
+    Download the chart (+ changelog when in changelogs, None = every pkg) of every pkg through the GraphQL API
+    of repo1, batch_size pkgs per request, straight into the package cache
 
+    Pkgs that couldn't be fetched this way are left to the raw file downloads of get_pkg_data
+    """
+    since = since or {}
+    batch_size = max(1, int(batch_size))
+    batches = []
+    # one query asks every project for the same paths, so chart only pkgs are batched on their own
+    for paths in ([CHART_PATH, CHANGELOG_PATH], [CHART_PATH]):
+        refs = [
+            (name, project_path(pkg["repo"], repo1.url), pkg["tag"])
+            for name, pkg in pkgs.items()
+            if (changelogs is None or name in changelogs) == (len(paths) == 2)
+        ]
+        refs = [ref for ref in refs if ref[1] is not None]
+        batches += [
+            (refs[i : i + batch_size], paths) for i in range(0, len(refs), batch_size)
+        ]
+
+    def fetch(batch):
+        refs, paths = batch
+        with profiler.span("get_blobs", packages=len(refs)):
+            try:
+                blobs = repo1.get_blobs([(path, tag) for _, path, tag in refs], paths)
+            except (requests.RequestException, ValueError) as e:
+                print(f"\n ERROR: GraphQL blob request failed ({e}), using raw files")
+                return
+        for (name, _, _), files in zip(refs, blobs):
+            files = files or {}
+            if any(files.get(path) is None for path in paths):
+                continue
+            store_chart(pkgs[name], files[CHART_PATH])
+            if CHANGELOG_PATH in paths:
+                store_changelog(
+                    pkgs[name], files[CHANGELOG_PATH].splitlines(), since.get(name)
+                )
+            profiler.count("graphql_blobs.fetched")
+
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as pool:
+        list(pool.map(fetch, batches))
+
+
+def uncached_pkgs(pkgs, since=None, changelogs=None):
+    """
+    The pkgs whose chart (+ changelog back to their since tag when in changelogs, None = every pkg)
+    aren't in the package cache yet
+    """
+    since = since or {}
+    missing = get_cache().missing(
+        [
+            (
+                pkg["repo"],
+                pkg["tag"],
+                since.get(name),
+                changelogs is None or name in changelogs,
+            )
+            for name, pkg in pkgs.items()
+        ]
+    )
+    missing = {(repo, tag) for repo, tag, _, _ in missing}
     return {
-        "chart": YAML().load(open(chart_path, "r")),
-        "changelog": keepachangelog.to_dict(changelog_path),
+        name: pkg for name, pkg in pkgs.items() if (pkg["repo"], pkg["tag"]) in missing
+    }
+
+
+def get_pkgs_data(
+    pkgs,
+    since=None,
+    max_workers=8,
+    repo1=None,
+    backend="raw",
+    batch_size=20,
+    changelogs=None,
+):
+    """
+    Fetch the Chart.yaml + CHANGELOG.md of every pkg in parallel, returns {name: data} in the same order as pkgs
+
+    since maps pkg names to the tag their changelog only needs to reach back to, changelogs limits the changelog
+    downloads to those pkg names (None = every pkg),
+    backend "graphql" batches the downloads through the GraphQL API of repo1, "raw" gets 2 raw files per pkg
+    """
+    since = since or {}
+    if backend == "graphql" and repo1 is not None:
+        missing = uncached_pkgs(pkgs, since, changelogs)
+        if missing:
+            fetch_blobs(repo1, missing, since, changelogs, batch_size, max_workers)
+    with ThreadPoolExecutor(max_workers=max(1, int(max_workers))) as pool:
+        futures = {
+            name: pool.submit(
+                get_pkg_data,
+                pkg,
+                since.get(name),
+                changelogs is None or name in changelogs,
+            )
+            for name, pkg in pkgs.items()
+        }
+    return {name: future.result() for name, future in futures.items()}
+
+
+def plan_pkgs(current_pkgs, previous_pkgs):
+    """
+    Diff the pkgs of two releases: {name: {status, tag, previous_tag, changelog}} in values.yaml order,
+    removed pkgs last
+
+    status is "new", "changed", "unchanged" or "removed", only changed pkgs need their changelog (for the diff),
+    every pkg still in the release needs its chart (for its table row)
+    """
+    plan = {}
+    for name, pkg in current_pkgs.items():
+        previous = previous_pkgs.get(name)
+        if previous is None:
+            status = "new"
+        elif previous["tag"] != pkg["tag"]:
+            status = "changed"
+        else:
+            status = "unchanged"
+        plan[name] = {
+            "status": status,
+            "tag": pkg["tag"],
+            "previous_tag": previous["tag"] if previous is not None else None,
+            "changelog": status == "changed",
+        }
+    for name, previous in previous_pkgs.items():
+        if name not in current_pkgs:
+            plan[name] = {
+                "status": "removed",
+                "tag": None,
+                "previous_tag": previous["tag"],
+                "changelog": False,
+            }
+    return plan
+
+
+def plan_fetches(plan):
+    """
+    (since, changelogs) for get_pkgs_data from a plan_pkgs plan
+    """
+    since = {
+        name: entry["previous_tag"]
+        for name, entry in plan.items()
+        if entry["changelog"]
     }
+    return since, set(since)
 
 
 def format_app_versions(app_versions):
@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+
+class Profiler:
+    """
+    Wall time of each step + HTTP request metrics, written w/ `r2d2 --profile`
+
+    Spans are exported as a JSON summary and as Chrome trace events (load in chrome://tracing or ui.perfetto.dev)
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self.requests = []
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name, category="step", **args):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.spans.append(
+                    {
+                        "name": name,
+                        "category": category,
+                        "start": start - self._origin,
+                        "duration": end - start,
+                        "thread": threading.get_ident(),
+                        "args": {k: str(v) for k, v in args.items()},
+                    }
+                )
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] += n
+
+    def record_request(self, method, url, status, start, duration, from_cache):
+        if not self.enabled:
+            return
+        parts = urlsplit(url)
+        with self._lock:
+            self.requests.append(
+                {
+                    "method": method,
+                    "host": parts.netloc,
+                    "path": parts.path,
+                    "status": status,
+                    "duration": duration,
+                    "from_cache": from_cache,
+                }
+            )
+            self.spans.append(
+                {
+                    "name": f"{method} {parts.netloc}{parts.path}",
+                    "category": "http",
+                    "start": start - self._origin,
+                    "duration": duration,
+                    "thread": threading.get_ident(),
+                    "args": {"status": str(status), "from_cache": str(from_cache)},
+                }
+            )
+
+    def summary(self):
+        steps = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        for span in self.spans:
+            if span["category"] == "http":
+                continue
+            step = steps[span["name"]]
+            step["count"] += 1
+            step["total_ms"] += span["duration"] * 1000
+            step["max_ms"] = max(step["max_ms"], span["duration"] * 1000)
+
+        by_host = defaultdict(list)
+        for request in self.requests:
+            by_host[request["host"]].append(request)
+
+        return {
+            "wall_ms": (time.perf_counter() - self._origin) * 1000,
+            "steps": dict(steps),
+            "http": {
+                host: request_stats(requests) for host, requests in by_host.items()
+            },
+            "http_total": request_stats(self.requests),
+            "counters": dict(self.counters),
+            "cache_hit_rates": hit_rates(self.counters),
+        }
+
+    def trace_events(self):
+        pid = os.getpid()
+        threads = {}
+        events = []
+        for span in self.spans:
+            tid = threads.setdefault(span["thread"], len(threads))
+            events.append(
+                {
+                    "name": span["name"],
+                    "cat": span["category"],
+                    "ph": "X",
+                    "ts": span["start"] * 1_000_000,
+                    "dur": span["duration"] * 1_000_000,
+                    "pid": pid,
+                    "tid": tid,
+                    "args": span["args"],
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, summary_path="r2d2-profile.json", trace_path="r2d2-trace.json"):
+        with open(summary_path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        with open(trace_path, "w") as f:
+            json.dump(self.trace_events(), f)
+
+
+def request_stats(requests):
+    durations = sorted(request["duration"] * 1000 for request in requests)
+    cached = sum(1 for request in requests if request["from_cache"])
+    return {
+        "requests": len(requests),
+        # status 0: the request never got a response
+        "errors": sum(1 for request in requests if not 0 < request["status"] < 400),
+        "from_cache": cached,
+        "cache_hit_rate": cached / len(requests) if requests else None,
+        "total_ms": sum(durations),
+        "p50_ms": percentile(durations, 50),
+        "p95_ms": percentile(durations, 95),
+        "max_ms": durations[-1] if durations else None,
+    }
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, len(sorted_values) * p // 100)]
+
+
+def hit_rates(counters):
+    """
+    {cache: hit rate} for every "<cache>.hit" / "<cache>.miss" counter pair
+    """
+    rates = {}
+    for name in counters:
+        if name.endswith(".hit") or name.endswith(".miss"):
+            cache = name.rsplit(".", 1)[0]
+            hits, misses = counters[f"{cache}.hit"], counters[f"{cache}.miss"]
+            rates[cache] = hits / (hits + misses) if hits + misses else None
+    return rates
+
+
+profiler = Profiler()
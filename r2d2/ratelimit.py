@@ -0,0 +1,125 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from .profiling import profiler
+
+RATE_LIMIT_DEFAULTS = {
+    "enabled": True,
+    "rate": 30,  # requests per second, per host (GitLab defaults to 2000/min)
+    "burst": 60,
+    "min_concurrency": 1,
+    "max_concurrency": 16,
+    "latency_target": 2.0,  # seconds, slower responses shrink the concurrency limit
+    "retries": 5,  # retries on 429/503, after Retry-After
+}
+
+
+class RateLimiter:
+    """
+    Token bucket (rate requests/s, up to burst back to back) + an AIMD concurrency limit, shared by every thread
+    talking to one host
+
+    429/503s halve the concurrency limit and pause every thread until Retry-After,
+    RateLimit-Remaining/RateLimit-Reset spread what's left of the budget until the reset,
+    slow responses shrink the limit and fast ones grow it back by about one request per round trip
+    """
+
+    def __init__(
+        self,
+        rate=RATE_LIMIT_DEFAULTS["rate"],
+        burst=RATE_LIMIT_DEFAULTS["burst"],
+        min_concurrency=RATE_LIMIT_DEFAULTS["min_concurrency"],
+        max_concurrency=RATE_LIMIT_DEFAULTS["max_concurrency"],
+        latency_target=RATE_LIMIT_DEFAULTS["latency_target"],
+    ):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.limit = float(max_concurrency)
+        self.tokens = float(burst)
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.rate_reset_at = 0.0
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.paused_until - now
+                if wait <= 0 and self.in_flight < max(1, int(self.limit)):
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        self.in_flight += 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                # None: wait for a request in flight to finish
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, status=None, headers=None, latency=None, backoff=1.0):
+        """
+        Return the slot taken by acquire, adapting the limits to the response
+        """
+        headers = headers or {}
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if status in (429, 503):
+                profiler.count("rate_limit.throttled")
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                retry_after = parse_retry_after(headers.get("Retry-After"))
+                self.paused_until = max(
+                    self.paused_until,
+                    now + (retry_after if retry_after is not None else backoff),
+                )
+            elif status is None or status >= 500:
+                self.limit = max(self.min_concurrency, self.limit / 2)
+            elif latency is not None and latency > self.latency_target:
+                self.limit = max(self.min_concurrency, self.limit * 0.75)
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+            remaining = headers.get("RateLimit-Remaining")
+            reset = headers.get("RateLimit-Reset")
+            if remaining is not None and reset is not None:
+                try:
+                    remaining = float(remaining)
+                    window = max(float(reset) - time.time(), 0.0)
+                except ValueError:
+                    window = None
+                if window is not None and remaining <= 0:
+                    # budget spent, wait for the reset
+                    self.paused_until = max(self.paused_until, now + window)
+                elif window:
+                    # spread what's left over the rest of the window, back to full speed once it resets
+                    self.rate = min(self.max_rate, remaining / window)
+                    self.rate_reset_at = now + window
+            self._cond.notify_all()
+
+    def _refill(self, now):
+        if self.rate < self.max_rate and now >= self.rate_reset_at:
+            self.rate = self.max_rate
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait from a Retry-After header (delay-seconds or an HTTP date), None when missing/invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
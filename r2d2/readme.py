@@ -1,4 +1,7 @@
+import copy
+import hashlib
 import importlib.resources
+import json
 import os
 from pathlib import Path
 
@@ -6,11 +9,28 @@ import keepachangelog
 from jinja2 import Template
 from tabulate import tabulate
 
-from .pkgs import format_app_versions, get_pkg_data
-
-
-def build_release_notes(repo1, current_pkgs, previous_pkgs, console, config):
-    notes_path = Path.cwd().joinpath(
+from .cache import get_cache, get_kv_cache
+from .pkgs import format_app_versions, get_pkgs_data, plan_fetches, plan_pkgs
+from .profiling import profiler
+
+# bump when the rendered row/changelog format changes, invalidates every cached fragment
+FRAGMENT_VERSION = 1
+
+
+def build_release_notes(
+    repo1,
+    current_pkgs,
+    previous_pkgs,
+    console,
+    config,
+    mr_changes=None,
+    notes_dir=None,
+):
+    """
+    Write the release notes of repo1.next_release_tag to notes_dir (the working directory when None),
+    returns their path
+    """
+    notes_path = Path(notes_dir or Path.cwd()).joinpath(
         f"release-notes-{repo1.next_release_tag.major}-{repo1.next_release_tag.minor}-{repo1.next_release_tag.patch}.md"
     )
 
@@ -27,118 +47,87 @@ def build_release_notes(repo1, current_pkgs, previous_pkgs, console, config):
     if Path.exists(notes_path):
         os.remove(notes_path)
 
-    notes = open(notes_path, "w")
-
     packages_table = []
 
     upgraded_packages = []
 
     changelog_diffs = {}
 
-    for name, pkg in current_pkgs.items():
-        is_new = previous_pkgs[name] is None
-
-        if not is_new:
-            haschanged = pkg["tag"] != previous_pkgs[name]["tag"]
-            if not haschanged:
-                console.info(f"{name} has not changed")
-                # dont include this package in the release notes
-                # continue
-            else:
-                console.warning(
-                    f"{name} has changed from {previous_pkgs[name]['tag']} to {pkg['tag']}"
-                )
-        else:
+    fragments = {}
+    keys = {}
+    plan = plan_pkgs(current_pkgs, previous_pkgs)
+    for name, entry in plan.items():
+        if entry["status"] == "new":
             console.info(f"{name} is new")
-            haschanged = False
-
-        console.spinner.start(f"Building {name}'s package changelog")
-
-        meta = get_pkg_data(pkg)
-        if meta is None:
-            console.spinner.error(
-                console.term.red(
-                    f"{name}@{pkg['tag']} Chart not found in repo1.dso.mil"
-                )
+        elif entry["status"] == "unchanged":
+            console.info(f"{name} has not changed")
+        elif entry["status"] == "changed":
+            console.warning(
+                f"{name} has changed from {entry['previous_tag']} to {entry['tag']}"
             )
+        else:
+            console.info(f"{name} was removed")
             continue
 
-        chart, changelog = meta["chart"], meta["changelog"]
-
-        app_versions = format_app_versions(
-            chart["annotations"]["bigbang.dev/applicationVersions"]
+        keys[name] = fragment_key(
+            name, current_pkgs[name], previous_pkgs.get(name), config
         )
 
-        # taken from r2-d2.yaml
-        if pkg["name"] in config["package_overrides"]:
-            pkg["name"] = config["package_overrides"][pkg["name"]]["name"]
-            pkg["title"] = config["package_overrides"][pkg["name"]]["title"]
-
-        url = pkg["repo"].replace(".git", "")
-        if haschanged and not is_new:
-            upgraded_packages.append(
-                {
-                    **pkg,
-                    "url": url,
-                    "last_tag": previous_pkgs[name]["tag"],
-                }
-            )
-
-        row_cols = [
-            f"[{pkg['title']}]({url})",
-            pkg["type"],
-            " ".join(app_versions),
-            f"`{pkg['tag']}`",
-        ]
-
-        if previous_pkgs[name] is None:
-            label = "New"
-        elif haschanged:
-            label = "Updated"
+    cached = get_kv_cache().get_many("release-notes-fragment", keys.values())
+    for name, key in keys.items():
+        if key in cached:
+            profiler.count("fragment_cache.hit")
+            fragments[name] = cached[key]
         else:
-            label = ""
-
-        if len(label) > 0:
-            row_cols[0] = (
-                # f"![{label}: {repo1.next_release_tag}](https://img.shields.io/badge/{label}-{repo1.next_release_tag}-informational?style=flat-square) "
-                f"![{label}](https://img.shields.io/badge/{label}-informational?style=flat-square) "
-                + row_cols[0]
-            )
-
-        # taken from r2-d2.yaml
-        pkg_is_beta = name in config["beta_list"]
-        if pkg_is_beta:
-            row_cols[
-                0
-            ] += " ![BETA](https://img.shields.io/badge/BETA-purple?style=flat-square)"
+            profiler.count("fragment_cache.miss")
 
-        packages_table.append(row_cols)
+    # only packages w/o a cached fragment need their chart, and only changed ones their changelog
+    missing = {name: pkg for name, pkg in current_pkgs.items() if name not in fragments}
+    since, changelogs = plan_fetches({name: plan[name] for name in missing})
+    console.spinner.start(
+        f"Fetching {len(missing)} package charts + {len(changelogs)} changelogs"
+    )
+    pkgs_data = get_pkgs_data(
+        missing,
+        # changelogs are only read back to the last release's tag
+        since=since,
+        max_workers=config.get("fetch_concurrency", 8),
+        repo1=repo1,
+        backend=config.get("fetch_backend", "graphql"),
+        batch_size=config.get("graphql_batch_size", 20),
+        changelogs=changelogs,
+    )
+    console.spinner.succeed(console.term.green("Fetched package charts + changelogs"))
 
-        # changelog diffs:
-        if changelog == None:
-            console.spinner.fail(
-                console.term.red(
-                    f"{name}@{pkg['tag']} Failed to parse CHANGELOG, manual intervention required."
-                )
-            )
+    built = {}
+    for name, pkg in missing.items():
+        console.spinner.start(f"Building {name}'s package changelog")
+        fragment = build_fragment(
+            name, pkg, previous_pkgs.get(name), pkgs_data[name], console, config
+        )
+        if fragment is None:
             continue
-        elif haschanged == True:
-            changelog_diff = {}
-
-            for k, v in changelog.items():
-                if k == previous_pkgs[name]["tag"]:
-                    break
-                changelog_diff[k] = v
-
-            dirty_diff = keepachangelog.from_dict(changelog_diff)
-            dirty_diff = dirty_diff.replace(" - 1970-01-01", "")
-            clean_diff = "\n".join(dirty_diff.split("\n")[6:-2])
-            changelog_diffs[pkg["title"]] = clean_diff
-
+        fragments[name] = fragment
+        if fragment["complete"]:
+            built[keys[name]] = fragment
         console.spinner.stop()
+    get_kv_cache().put_many("release-notes-fragment", built)
 
-    notes.write(
-        md_template.render(
+    # splice the fragments back together in values.yaml order
+    for name in current_pkgs:
+        fragment = fragments.get(name)
+        if fragment is None:
+            continue
+        packages_table.append(fragment["row"])
+        if fragment["upgraded"] is not None:
+            upgraded_packages.append(fragment["upgraded"])
+        if fragment["changelog"] is not None:
+            title, clean_diff = fragment["changelog"]
+            changelog_diffs[title] = clean_diff
+
+    # streamed straight into the file, MRs are paged in while their section is written
+    with profiler.span("render"), open(notes_path, "w") as notes:
+        md_template.stream(
             packages_table=tabulate(
                 packages_table,
                 headers=["Package", "Type", "Package Version", "BB Version"],
@@ -146,12 +135,129 @@ def build_release_notes(repo1, current_pkgs, previous_pkgs, console, config):
             ),
             last_release=repo1.last_release_tag,
             next_release_tag=repo1.next_release_tag,
-            mr_changes=repo1.get_completed_mrs(),
+            # fetched ahead of time by the step scheduler, else paged in here
+            mr_changes=mr_changes
+            if mr_changes is not None
+            else repo1.get_completed_mrs(
+                backend=config.get("fetch_backend", "graphql")
+            ),
             changelog_diffs=changelog_diffs,
             upgraded_packages=upgraded_packages,
+        ).dump(notes)
+
+    console.success("Release notes written to ./build/")
+
+    return notes_path
+
+
+def fragment_key(name, pkg, previous_pkg, config):
+    """
+    Everything a package's row + changelog section depend on
+    """
+    key = json.dumps(
+        [
+            FRAGMENT_VERSION,
+            name,
+            pkg,
+            previous_pkg["tag"] if previous_pkg is not None else None,
+            config["package_overrides"].get(pkg["name"]),
+            name in config["beta_list"],
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def build_fragment(name, pkg, previous_pkg, meta, console, config):
+    """
+    The packages table row, upgrade notice + changelog diff of a single package
+
+    Returns None when its chart is missing, "complete" is False when its changelog couldn't be parsed
+    """
+    pkg = copy.deepcopy(pkg)
+    is_new = previous_pkg is None
+    haschanged = not is_new and pkg["tag"] != previous_pkg["tag"]
+
+    if meta is None:
+        console.spinner.fail(
+            console.term.red(f"{name}@{pkg['tag']} Chart not found in repo1.dso.mil")
         )
+        return None
+
+    chart = meta["chart"]
+
+    app_versions = format_app_versions(
+        chart["annotations"]["bigbang.dev/applicationVersions"]
     )
 
-    notes.close()
+    # taken from r2-d2.yaml
+    if pkg["name"] in config["package_overrides"]:
+        pkg["name"] = config["package_overrides"][pkg["name"]]["name"]
+        pkg["title"] = config["package_overrides"][pkg["name"]]["title"]
+
+    url = pkg["repo"].replace(".git", "")
+    upgraded = None
+    if haschanged:
+        upgraded = {
+            **pkg,
+            "url": url,
+            "last_tag": previous_pkg["tag"],
+        }
+
+    row_cols = [
+        f"[{pkg['title']}]({url})",
+        pkg["type"],
+        " ".join(app_versions),
+        f"`{pkg['tag']}`",
+    ]
+
+    if is_new:
+        label = "New"
+    elif haschanged:
+        label = "Updated"
+    else:
+        label = ""
+
+    if len(label) > 0:
+        row_cols[0] = (
+            # f"![{label}: {repo1.next_release_tag}](https://img.shields.io/badge/{label}-{repo1.next_release_tag}-informational?style=flat-square) "
+            f"![{label}](https://img.shields.io/badge/{label}-informational?style=flat-square) "
+            + row_cols[0]
+        )
 
-    console.success("Release notes written to ./build/")
+    # taken from r2-d2.yaml
+    pkg_is_beta = name in config["beta_list"]
+    if pkg_is_beta:
+        row_cols[
+            0
+        ] += " ![BETA](https://img.shields.io/badge/BETA-purple?style=flat-square)"
+
+    fragment = {
+        "row": row_cols,
+        "upgraded": upgraded,
+        "changelog": None,
+        "complete": True,
+    }
+
+    # changelog diffs:
+    if haschanged:
+        # everything newer than the last release's tag, sliced straight out of the package cache
+        changelog_diff = get_cache().changelog_since(
+            pkg["repo"], pkg["tag"], previous_pkg["tag"]
+        )
+        if changelog_diff is None:
+            console.spinner.fail(
+                console.term.red(
+                    f"{name}@{pkg['tag']} Failed to parse CHANGELOG, manual intervention required."
+                )
+            )
+            fragment["complete"] = False
+            return fragment
+
+        dirty_diff = keepachangelog.from_dict(changelog_diff)
+        dirty_diff = dirty_diff.replace(" - 1970-01-01", "")
+        clean_diff = "\n".join(dirty_diff.split("\n")[6:-2])
+        fragment["changelog"] = [pkg["title"], clean_diff]
+
+    return fragment
@@ -1,22 +1,29 @@
+import atexit
+import copy
 import os
 from pathlib import Path
 
-import docker
 import git
-from ruamel.yaml import YAML
 
-yaml = YAML(typ="rt")
-# indent 2 spaces extra on lists
-yaml.indent(mapping=2, sequence=4, offset=2)
-# prevent opinionated line wrapping
-yaml.width = 1000
+from .bump import VERSION_REFS, bump_versions
+from .cache import get_kv_cache
+from .helmdocs import content_hash, helm_docs_runner
+from .loaders import safe_load
+from .profiling import profiler
+from .tags import TagIndex
 
 
 class BigBangRepo:
-    def __init__(self, bb_path):
+    def __init__(self, bb_path, git_sync="pull"):
+        """
+        git_sync "pull" pulls on open (as before), "minimal" only fetches the refs a run needs, see sync
+        """
         self.bb_path = bb_path
         self.abs_bb_path = Path.cwd().joinpath(bb_path)
         self.repo = git.Repo(self.abs_bb_path)
+        self.git_sync = git_sync
+        self._pkgs_by_blob = {}
+        self._helm_docs = {}
 
         if self.repo.is_dirty():
             print(
@@ -24,11 +31,118 @@ class BigBangRepo:
             )
             exit()
         else:
-            self.repo.git.pull()
+            if git_sync == "pull":
+                self.pull()
             self.repo.git.checkout("master")
 
     def pull(self):
-        self.repo.git.pull()
+        try:
+            self.repo.git.pull()
+        except git.GitCommandError:
+            # offline, work from the local refs
+            print("Unable to pull the local Big Bang repo, using the local refs")
+
+    def sync(self, refs=("master",), tags=False):
+        """
+        Fetch only refs (branch or tag names, + every tag when tags) from origin
+
+        Skipped when `git ls-remote` shows the local copies are current, shallow clones are fetched w/ --depth=1
+        and partial clones (--filter=blob:none) fetch the blobs they read on demand
+
+        Local branches of refs are fast-forwarded to their origin/* copy, returns whether anything was fetched
+        """
+        patterns = [f"refs/heads/{ref}" for ref in refs] + [
+            f"refs/tags/{ref}" for ref in refs
+        ]
+        if tags:
+            patterns.append("refs/tags/*")
+        try:
+            with profiler.span("ls_remote"):
+                remote = self._ls_remote(patterns)
+            local = self._local_refs()
+
+            refspecs = []
+            for ref, sha in remote.items():
+                if ref.startswith("refs/heads/"):
+                    dest = "refs/remotes/origin/" + ref[len("refs/heads/") :]
+                else:
+                    dest = ref
+                if local.get(dest) != sha:
+                    refspecs.append(f"+{ref}:{dest}")
+            fetched = bool(refspecs)
+            if fetched:
+                profiler.count("git_sync.fetch")
+                depth = ["--depth=1"] if self._is_shallow() else []
+                with profiler.span("git_fetch", refs=len(refspecs)):
+                    self.repo.git.fetch(*depth, "--no-tags", "origin", *refspecs)
+            else:
+                profiler.count("git_sync.skip")
+        except git.GitCommandError:
+            # offline, work from the local refs
+            print("Unable to fetch the local Big Bang repo, using the local refs")
+            fetched = False
+
+        # local branches follow their origin/* copy, like a pull would, even when an earlier run did the fetch
+        for ref in refs:
+            self._fast_forward(ref)
+        return fetched
+
+    def _fast_forward(self, branch):
+        """
+        Move the local branch (if there is one) up to origin/<branch>, diverged branches are left alone
+        """
+        try:
+            local = self.repo.commit(f"refs/heads/{branch}")
+            remote = self.repo.commit(f"refs/remotes/origin/{branch}")
+        except (git.BadName, git.BadObject, ValueError):
+            return
+        if local == remote:
+            return
+        try:
+            if not self.repo.is_ancestor(local, remote):
+                print(
+                    f"Local {branch} isn't behind origin/{branch} (diverged or shallow), using the local branch"
+                )
+                return
+            if (
+                not self.repo.head.is_detached
+                and self.repo.active_branch.name == branch
+            ):
+                if self.repo.is_dirty():
+                    print(
+                        f"Local {branch} has pending changes, not fast-forwarding it to origin/{branch}"
+                    )
+                    return
+                self.repo.git.merge("--ff-only", f"origin/{branch}")
+            else:
+                self.repo.git.update_ref(
+                    f"refs/heads/{branch}", remote.hexsha, local.hexsha
+                )
+            profiler.count("git_sync.fast_forward")
+        except git.GitCommandError:
+            print(
+                f"Unable to fast-forward the local {branch} to origin/{branch}, using the local branch"
+            )
+
+    def _ls_remote(self, patterns):
+        remote = {}
+        for line in self.repo.git.ls_remote("origin", *patterns).splitlines():
+            sha, ref = line.split("\t")
+            # peeled annotated tags, the tag object itself is what we store
+            if not ref.endswith("^{}"):
+                remote[ref] = sha
+        return remote
+
+    def _local_refs(self):
+        refs = self.repo.git.for_each_ref(
+            "--format=%(objectname) %(refname)", "refs/remotes/origin", "refs/tags"
+        )
+        return {
+            ref: sha for sha, ref in (line.split(" ", 1) for line in refs.splitlines())
+        }
+
+    def _is_shallow(self):
+        return self.repo.git.rev_parse("--is-shallow-repository") == "true"
 
     def checkout(self, ref):
         if self.repo.is_dirty():
@@ -38,13 +152,84 @@ class BigBangRepo:
             return
         self.repo.git.checkout(ref)
 
-    def get_pkgs(self):
+    def get_pkgs(self, ref=None):
         """
         Use the values.yaml located in bigbang/chart/values.yaml to get the pkgs and their versions
+
+        When a ref is given, values.yaml is read straight from the git object database instead of the working tree,
+        parsed results are memoized by blob SHA
         """
+        if ref is None:
+            values_yaml = open(self.bb_path + "/chart/values.yaml", "r")
+            return self._parse_pkgs(safe_load(values_yaml))
+
+        blob = self._resolve_commit(ref).tree / "chart/values.yaml"
+        if blob.hexsha in self._pkgs_by_blob:
+            profiler.count("values_yaml_memo.hit")
+        else:
+            profiler.count("values_yaml_memo.miss")
+            self._pkgs_by_blob[blob.hexsha] = self._parse_pkgs(
+                safe_load(blob.data_stream.read())
+            )
+        # callers mutate pkgs (package_overrides), so never hand out the memoized copy
+        return copy.deepcopy(self._pkgs_by_blob[blob.hexsha])
+
+    def get_release_tags(self):
+        """
+        Non-rc semver tags of the local repo, oldest first
+        """
+        return self.tag_index().versions
+
+    def tag_index(self):
+        """
+        TagIndex of the local tags + origin's release branches
+
+        Stored in the kv cache under the mtimes of packed-refs and the loose ref directories,
+        so refs are only listed again after a fetch (or gc) changed them
+        """
+        key = self._refs_stamp()
+        refs = get_kv_cache().get("tag-index", key)
+        if refs is not None:
+            profiler.count("tag_index.hit")
+        else:
+            profiler.count("tag_index.miss")
+            local = self._local_refs()
+            refs = {
+                "tags": {
+                    ref[len("refs/tags/") :]: sha
+                    for ref, sha in local.items()
+                    if ref.startswith("refs/tags/")
+                },
+                "branches": {
+                    ref[len("refs/remotes/origin/") :]: sha
+                    for ref, sha in local.items()
+                    if ref.startswith("refs/remotes/origin/release-")
+                },
+            }
+            get_kv_cache().put("tag-index", key, refs)
+        return TagIndex(refs["tags"], refs["branches"])
+
+    def _refs_stamp(self):
+        git_dir = self.repo.common_dir
+        mtimes = []
+        for path in ("packed-refs", "refs/tags", "refs/remotes/origin"):
+            try:
+                mtimes.append(os.stat(os.path.join(git_dir, path)).st_mtime_ns)
+            except FileNotFoundError:
+                mtimes.append(0)
+        return ":".join([os.path.abspath(git_dir)] + [str(m) for m in mtimes])
+
+    def _resolve_commit(self, ref):
+        # prefer the local ref (same as a checkout would), fall back to the remote tracking branch
+        for candidate in (ref, f"origin/{ref}"):
+            try:
+                return self.repo.commit(candidate)
+            except (git.BadName, git.BadObject, ValueError):
+                continue
+        raise ValueError(f"Unable to find {ref} in {self.bb_path}")
+
+    def _parse_pkgs(self, values):
         pkgs = {}
-        values_yaml = open(self.bb_path + "/chart/values.yaml", "r")
-        values = yaml.load(values_yaml)
 
         # core
         for _, v in values.items():
@@ -67,27 +252,33 @@ class BigBangRepo:
 
         return pkgs
 
-    def run_helm_docs(self):
-        client = docker.from_env()
-        readme = client.containers.run(
-            "jnorwood/helm-docs:v1.5.0",
-            "-s file -t .gitlab/README.md.gotmpl --dry-run",
-            volumes=[f"{self.abs_bb_path}:/helm-docs"],
-        )
-        open(self.abs_bb_path + "/README.md", "w").write(readme.decode("utf-8"))
-
-    def update_base_gitrepository_yaml(self, next_release_tag):
-        base_gitrepo_yaml_path = Path.joinpath(self.bb_path, "base/gitrepository.yaml")
-        with open(base_gitrepo_yaml_path) as base_gitrepo_yaml:
-            base_gitrepo = yaml.load(base_gitrepo_yaml)
-        with open(base_gitrepo_yaml_path, "w") as base_gitrepo_yaml:
-            base_gitrepo["spec"]["ref"]["tag"] = next_release_tag
-            yaml.dump(base_gitrepo, base_gitrepo_yaml)
-
-    def update_chart_release_version(self, next_release_tag):
-        chart_yaml_path = Path.joinpath(self.bb_path, "chart/Chart.yaml")
-        with open(chart_yaml_path) as chart_yaml:
-            chart = yaml.load(chart_yaml)
-        with open(chart_yaml_path, "w") as chart_yaml:
-            chart["version"] = next_release_tag
-            yaml.dump(chart, chart_yaml)
+    def run_helm_docs(self, runner="auto"):
+        """
+        Regenerate README.md w/ helm-docs, reusing the last output when the chart + template are unchanged
+
+        The runner (+ its warm container) is kept for later runs on this repo and closed at exit
+        """
+        readme_path = self.abs_bb_path.joinpath("README.md")
+        helm_docs = self._helm_docs.get(runner)
+        if helm_docs is None:
+            helm_docs = self._helm_docs[runner] = helm_docs_runner(
+                self.abs_bb_path, runner
+            )
+            atexit.register(helm_docs.close)
+        key = content_hash(self.abs_bb_path, helm_docs)
+        readme = get_kv_cache().get("helm-docs", key)
+        if readme is not None:
+            profiler.count("helm_docs_cache.hit")
+        else:
+            profiler.count("helm_docs_cache.miss")
+            readme = helm_docs.run()
+            get_kv_cache().put("helm-docs", key, readme)
+
+        if not readme_path.exists() or readme_path.read_text() != readme:
+            readme_path.write_text(readme)
+
+    def bump_version(self, next_release_tag, refs=VERSION_REFS):
+        """
+        Point every version reference in refs at next_release_tag, returns the files that changed
+        """
+        return bump_versions(self.abs_bb_path, next_release_tag, refs)
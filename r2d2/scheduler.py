@@ -0,0 +1,105 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .profiling import profiler
+
+
+class Step:
+    """
+    A unit of work, called w/ the values named in requires once they're all available
+
+    Its return value is stored under provides (a name, or a tuple of names for a returned tuple)
+    """
+
+    def __init__(
+        self, name, fn, requires=(), provides=None, exclusive=False, label=None
+    ):
+        self.name = name
+        self.fn = fn
+        self.requires = tuple(requires)
+        self.provides = provides
+        # prompts: run on the main thread w/ nothing else running
+        self.exclusive = exclusive
+        # printed w/ the step's duration once it's done, None for steps that report themselves
+        self.label = label
+
+
+class Scheduler:
+    """
+    Runs a DAG of steps, overlapping every step whose inputs are ready in a thread pool
+
+    Exclusive steps wait for the running steps to finish and block new ones until they're done
+    """
+
+    def __init__(self, console, max_workers=4):
+        self.console = console
+        self.max_workers = max_workers
+        self.steps = []
+
+    def add(self, name, fn, requires=(), provides=None, exclusive=False, label=None):
+        self.steps.append(Step(name, fn, requires, provides, exclusive, label))
+
+    def run(self, **values):
+        pending = list(self.steps)
+        running = {}
+        concurrent = self.console.concurrent
+        # halo can't animate steps running side by side, report them line by line instead
+        self.console.concurrent = True
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                while pending or running:
+                    ready = [
+                        step
+                        for step in pending
+                        if all(name in values for name in step.requires)
+                    ]
+                    exclusive = next((step for step in ready if step.exclusive), None)
+                    if exclusive is not None:
+                        if not running:
+                            pending.remove(exclusive)
+                            self.store(exclusive, self.call(exclusive, values), values)
+                        else:
+                            self.wait(running, values)
+                        continue
+
+                    for step in ready:
+                        pending.remove(step)
+                        running[pool.submit(self.call, step, values)] = step
+
+                    if not running:
+                        missing = {
+                            name
+                            for step in pending
+                            for name in step.requires
+                            if name not in values
+                        }
+                        raise RuntimeError(
+                            f"Steps {[step.name for step in pending]} are waiting on {sorted(missing)}, which no step provides"
+                        )
+                    self.wait(running, values)
+        finally:
+            self.console.concurrent = concurrent
+        return values
+
+    def wait(self, running, values):
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            step = running.pop(future)
+            self.store(step, future.result(), values)
+
+    def call(self, step, values):
+        start = time.perf_counter()
+        # own name + category, steps like auth + fetch_pkgs time themselves w/ a span of the same name
+        with profiler.span(f"dag.{step.name}", category="dag"):
+            result = step.fn(**{name: values[name] for name in step.requires})
+        if step.label is not None:
+            self.console.success(f"{step.label} ({time.perf_counter() - start:.1f}s)")
+        return result
+
+    def store(self, step, result, values):
+        if step.provides is None:
+            return
+        if isinstance(step.provides, tuple):
+            values.update(zip(step.provides, result))
+        else:
+            values[step.provides] = result
@@ -0,0 +1,258 @@
+import hashlib
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.util.retry import Retry
+
+from .cache import get_response_cache
+from .profiling import profiler
+from .ratelimit import RATE_LIMIT_DEFAULTS, RateLimiter
+
+HTTP_DEFAULTS = {
+    "timeout": 30,
+    "retries": 5,
+    "backoff_factor": 0.5,
+    "pool_size": 16,
+}
+
+HTTP_CACHE_DEFAULTS = {
+    "enabled": True,
+    # seconds a cached GitLab API response is served w/o revalidating, per endpoint
+    # 0 = always revalidate w/ If-None-Match (a 304 costs no response body)
+    "ttl": {
+        "default": 0,
+        "projects": 3600,
+        "releases": 300,
+        "branches": 0,
+        "merge_requests": 60,
+    },
+}
+
+# /api/v4/projects/:id/<endpoint>/... or /api/v4/projects/:id/repository/<endpoint>/...
+API_ENDPOINT = re.compile(r"/api/v4/projects/[^/?]+(?:/(?:repository/)?([^/?]+))?")
+
+_session = None
+
+
+class ThrottledAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that sends through a RateLimiter per host, retrying 429/503s once the limiter lets it
+    """
+
+    def __init__(self, rate_limit=None, backoff_factor=0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.rate_limit = rate_limit
+        self.backoff_factor = backoff_factor
+        self.limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self.limiters:
+                self.limiters[host] = RateLimiter(
+                    **{
+                        k: v
+                        for k, v in self.rate_limit.items()
+                        if k not in ("enabled", "retries")
+                    }
+                )
+            return self.limiters[host]
+
+    def send(self, request, **kwargs):
+        if self.rate_limit is None:
+            return super().send(request, **kwargs)
+
+        limiter = self.limiter(request.url)
+        retries = self.rate_limit["retries"]
+        for attempt in range(retries + 1):
+            limiter.acquire()
+            start = time.perf_counter()
+            response = None
+            try:
+                response = super().send(request, **kwargs)
+            finally:
+                limiter.release(
+                    response.status_code if response is not None else None,
+                    response.headers if response is not None else None,
+                    time.perf_counter() - start,
+                    backoff=self.backoff_factor * 2**attempt,
+                )
+            if response.status_code not in (429, 503) or attempt == retries:
+                return response
+            response.close()
+        return response
+
+
+class CachingAdapter(ThrottledAdapter):
+    """
+    HTTPAdapter that keeps GitLab API GET responses in the response cache
+
+    Fresh entries (younger than their endpoint's ttl) are served w/o a request,
+    stale ones are revalidated w/ If-None-Match/If-Modified-Since so unchanged resources come back as 304s
+    and are served as-is when repo1 can't be reached (offline runs after `r2d2 prefetch`)
+    """
+
+    def __init__(self, response_cache=None, ttls=None, **kwargs):
+        super().__init__(**kwargs)
+        self.response_cache = response_cache
+        self.ttls = ttls or {}
+
+    def ttl(self, url):
+        match = API_ENDPOINT.search(url)
+        endpoint = (match.group(1) or "projects") if match else "default"
+        return self.ttls.get(endpoint, self.ttls.get("default", 0))
+
+    def send(self, request, **kwargs):
+        if (
+            self.response_cache is None
+            or request.method != "GET"
+            or "/api/v4/" not in request.url
+        ):
+            return super().send(request, **kwargs)
+
+        # responses depend on who is asking
+        token = request.headers.get("PRIVATE-TOKEN", "")
+        key = hashlib.sha256(f"{token} {request.url}".encode()).hexdigest()
+
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            # no-cache: revalidate even a fresh entry, e.g. the token check in BigBangRepo1.authenticate
+            if request.headers.get("Cache-Control") != "no-cache" and (
+                time.time() - cached["stored_at"] < self.ttl(request.url)
+            ):
+                return self.build_cached_response(request, cached)
+            if "ETag" in cached["headers"]:
+                request.headers["If-None-Match"] = cached["headers"]["ETag"]
+            if "Last-Modified" in cached["headers"]:
+                request.headers["If-Modified-Since"] = cached["headers"][
+                    "Last-Modified"
+                ]
+
+        try:
+            response = super().send(request, **kwargs)
+        except requests.ConnectionError:
+            if cached is None:
+                raise
+            profiler.count("http_cache.stale_if_error")
+            return self.build_cached_response(request, cached)
+
+        if response.status_code == 304 and cached is not None:
+            self.response_cache.touch(key)
+            return self.build_cached_response(request, cached)
+        if response.status_code == 200 and (
+            "ETag" in response.headers or "Last-Modified" in response.headers
+        ):
+            headers = {
+                k: v
+                for k, v in response.headers.items()
+                # the body is stored decoded
+                if k.lower() not in ("content-encoding", "content-length")
+            }
+            self.response_cache.put(key, request.url, headers, response.content)
+        return response
+
+    def build_cached_response(self, request, cached):
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = request.url
+        response.request = request
+        response.headers = CaseInsensitiveDict(cached["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = cached["body"]
+        response.from_cache = True
+        return response
+
+
+class Session(requests.Session):
+    """
+    requests.Session w/ a default timeout, a shared keep-alive connection pool, exponential backoff retries
+    and an adaptive rate limit per host
+    """
+
+    def __init__(
+        self,
+        timeout,
+        retries,
+        backoff_factor,
+        pool_size,
+        response_cache=None,
+        ttls=None,
+        rate_limit=None,
+    ):
+        super().__init__()
+        self.timeout = timeout
+        self.headers.update({"Accept-Encoding": "gzip, deflate"})
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            # 429/503 are retried by the rate limiter, so every thread backs off together
+            status_forcelist=(500, 502, 504)
+            if rate_limit is not None
+            else (429, 500, 502, 503, 504),
+            # hand the last response back so callers can still check status_code
+            raise_on_status=False,
+            respect_retry_after_header=rate_limit is None,
+        )
+        adapter = CachingAdapter(
+            response_cache=response_cache,
+            ttls=ttls,
+            rate_limit=rate_limit,
+            backoff_factor=backoff_factor,
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=retry,
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        # python-gitlab always passes timeout, even when it is None
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        start = time.perf_counter()
+        response = None
+        try:
+            response = super().request(method, url, **kwargs)
+            return response
+        finally:
+            profiler.record_request(
+                method,
+                url,
+                response.status_code if response is not None else 0,
+                start,
+                time.perf_counter() - start,
+                getattr(response, "from_cache", False),
+            )
+
+
+def configure_session(config=None):
+    """
+    Build the shared session from the `http`, `http_cache` + `rate_limit` sections of ~/.r2d2/config.yaml
+    """
+    global _session
+    config = config or {}
+    settings = {**HTTP_DEFAULTS, **(config.get("http") or {})}
+    cache_settings = {**HTTP_CACHE_DEFAULTS, **(config.get("http_cache") or {})}
+    rate_limit = {**RATE_LIMIT_DEFAULTS, **(config.get("rate_limit") or {})}
+    _session = Session(
+        **{k: settings[k] for k in HTTP_DEFAULTS},
+        response_cache=get_response_cache() if cache_settings["enabled"] else None,
+        ttls={**HTTP_CACHE_DEFAULTS["ttl"], **(cache_settings["ttl"] or {})},
+        rate_limit=rate_limit if rate_limit["enabled"] else None,
+    )
+    return _session
+
+
+def get_session():
+    if _session is None:
+        return configure_session()
+    return _session
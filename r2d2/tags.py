@@ -0,0 +1,79 @@
+import semver
+
+
+def release_tag_x(version):
+    """
+    Release branch suffix of a release tag, e.g. 1.2.x for 1.2.0
+    """
+    if version.patch == 0:
+        # was a minor release
+        return ".".join(str(version).split(".")[:2]) + ".x"
+    elif version.minor == 0:
+        # was a major release
+        return str(version).split(".")[0] + ".x.x"
+    # was a patch release
+    return str(version)
+
+
+def next_release(version, release_type):
+    """
+    (next release tag, its release branch suffix) after version
+    """
+    if release_type == "major":
+        next_release_tag = version.bump_major()
+        return next_release_tag, str(next_release_tag).split(".")[0] + ".x.x"
+    elif release_type == "minor":
+        next_release_tag = version.bump_minor()
+        return next_release_tag, ".".join(str(next_release_tag).split(".")[:2]) + ".x"
+    elif release_type == "patch":
+        next_release_tag = version.bump_patch()
+        # idk what to do here lol ^^
+        return next_release_tag, str(next_release_tag)
+    return "", None
+
+
+class TagIndex:
+    """
+    Release tags + release branches of the local Big Bang clone, sorted in memory
+
+    tags and branches map names to SHAs, as stored by BigBangRepo.tag_index
+    """
+
+    def __init__(self, tags, branches):
+        self.tags = tags
+        self.branches = branches
+        versions = []
+        for name in tags:
+            if "rc" in name:
+                continue
+            try:
+                versions.append(semver.VersionInfo.parse(name))
+            except ValueError:
+                continue
+        # oldest first
+        self.versions = sorted(versions)
+
+    def last_release(self, before=None):
+        """
+        Newest non-rc release (older than before when given), None when there is none
+        """
+        versions = [v for v in self.versions if before is None or v < before]
+        return versions[-1] if versions else None
+
+    def next_release(self, version):
+        """
+        Oldest release newer than version, None when version is the newest
+        """
+        return next((v for v in self.versions if v > version), None)
+
+    def branch_for(self, version):
+        """
+        Name of the release branch version was (or will be) released from, None when it isn't in the clone
+        """
+        version = semver.VersionInfo.parse(str(version))
+        candidates = [
+            f"release-{version.major}.{version.minor}.x",
+            f"release-{version.major}.x.x",
+            f"release-{release_tag_x(version)}",
+        ]
+        return next((name for name in candidates if name in self.branches), None)
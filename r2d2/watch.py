@@ -0,0 +1,109 @@
+import time
+
+import git
+import gitlab
+import requests
+
+from .profiling import profiler
+from .readme import build_release_notes
+
+
+class Watcher:
+    """
+    Keeps the release notes of the next release current while its release branch + milestone MRs move
+
+    The Repo1 session, the parsed values.yaml of every commit seen and the package fragments stay warm
+    between polls, a poll costs a branch request + the MR pages, revalidated w/ their ETags
+    """
+
+    def __init__(self, repo1, repo, console, config):
+        self.repo1 = repo1
+        self.repo = repo
+        self.console = console
+        self.config = config
+        self.branch = repo1.release_branch
+        self.branch_sha = None
+        self.pkgs = {}
+        self.mrs = None
+        self.notes_path = None
+        self.pkgs_last_release = repo.get_pkgs(ref=str(repo1.last_release_tag))
+
+    def poll(self):
+        """
+        Check the release branch + MRs once, re-render the notes when either changed
+
+        Returns the changed sections: package names + "merge requests"
+        """
+        changed = []
+
+        branch = self.repo1.get_branch(self.branch, refresh=True)
+        if branch is False:
+            self.console.error(f"Release branch '{self.branch}' not found")
+            return changed
+        sha = branch.commit.get("id") or branch.commit["short_id"]
+        if sha != self.branch_sha:
+            # sync reports a failed fetch instead of raising, so check what it actually fetched
+            self.repo.sync([self.branch])
+            try:
+                fetched = self.repo.repo.commit(f"origin/{self.branch}").hexsha
+            except (git.BadName, git.BadObject, ValueError):
+                fetched = None
+            if fetched is None or not fetched.startswith(sha):
+                # branch_sha stays put, so the next poll tries again
+                self.console.warning(
+                    f"origin/{self.branch} isn't at {sha} yet, retrying next poll"
+                )
+            else:
+                # origin's copy, a stale local branch of the same name would hide new commits
+                pkgs = self.repo.get_pkgs(ref=f"origin/{self.branch}")
+                changed += [
+                    name
+                    for name in {**self.pkgs, **pkgs}
+                    if self.pkgs.get(name) != pkgs.get(name)
+                ]
+                self.branch_sha, self.pkgs = sha, pkgs
+
+        mrs = list(self.repo1.get_completed_mrs(backend="raw"))
+        if mrs != self.mrs:
+            changed.append("merge requests")
+            self.mrs = mrs
+
+        if changed:
+            # unchanged packages come straight from the fragment cache
+            with profiler.span("build_release_notes"):
+                self.notes_path = build_release_notes(
+                    repo1=self.repo1,
+                    current_pkgs=self.pkgs,
+                    previous_pkgs=self.pkgs_last_release,
+                    console=self.console,
+                    config=self.config,
+                    mr_changes=self.mrs,
+                )
+        return changed
+
+    def run(self, interval=15):
+        while True:
+            start = time.perf_counter()
+            try:
+                changed = self.poll()
+            except gitlab.exceptions.GitlabAuthenticationError:
+                # no poll will get past a rejected token
+                raise
+            except (
+                requests.RequestException,
+                gitlab.exceptions.GitlabError,
+                git.GitCommandError,
+                # get_pkgs: the branch was recreated or its fetch failed
+                ValueError,
+            ) as e:
+                # keep watching, repo1 + the branch may be back by the next poll
+                self.console.error(f"Poll failed: {e}")
+                changed = []
+            if changed:
+                sections = ", ".join(changed[:5])
+                if len(changed) > 5:
+                    sections += f" + {len(changed) - 5} more"
+                self.console.success(
+                    f"Re-rendered {self.notes_path.name} ({time.perf_counter() - start:.1f}s): {sections}"
+                )
+            time.sleep(interval)